@@ -0,0 +1 @@
+# Benchmarks for the tracker's hot paths (not tests): python -m bench --help
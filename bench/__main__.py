@@ -0,0 +1,81 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from bench.micro import run_micro
+from bench.seed import seed_database
+from bench.load import run_load
+
+# python -m bench [--sizes 1000,10000,100000] [--out results.json]
+# Prints (or writes) one JSON document, compare two of them across commits.
+
+DEFAULT_SIZES = '1000,10000,100000'
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the tracker hot paths, results as JSON.')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma-separated database sizes (units)')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per load scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads per load scenario')
+    parser.add_argument('--scenario', action='append', help='Only run this load scenario (repeatable)')
+    parser.add_argument('--no-response-cache', action='store_true', help='Disable the in-process response cache')
+    parser.add_argument('--micro-only', action='store_true')
+    parser.add_argument('--load-only', action='store_true')
+    parser.add_argument('--db-dir', default=os.path.join(tempfile.gettempdir(), 'switch-tracker-bench'),
+                        help='Where seeded databases are kept between runs')
+    parser.add_argument('--out', help='Write results to this file instead of stdout')
+    parser.add_argument('--log-slow-queries', action='store_true', help='Keep the slow query log on stderr')
+    args = parser.parse_args(argv)
+
+    if not args.log_slow_queries:
+        # Seeding runs 500-row batches that would all be reported
+        logging.getLogger('src.db').setLevel(logging.ERROR)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'response_cache': not args.no_response_cache,
+        },
+    }
+
+    if not args.load_only:
+        print('micro benchmarks...', file=sys.stderr)
+        results['micro'] = run_micro()
+
+    if not args.micro_only:
+        os.makedirs(args.db_dir, exist_ok=True)
+        results['load'] = {}
+        for size in (int(s) for s in args.sizes.split(',') if s.strip()):
+            print(f'seeding {size} units...', file=sys.stderr)
+            path = seed_database(os.path.join(args.db_dir, f'bench-{size}.db'), size)
+            print(f'load at {size} units...', file=sys.stderr)
+            results['load'][str(size)] = run_load(path, size, args.requests, args.concurrency,
+                                                  response_cache=not args.no_response_cache, only=args.scenario)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
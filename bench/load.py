@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import src.app as tracker
+from src.db import close_connections
+from bench.seed import unit_barcode, ISSUES, OWNERS
+
+# Request-level load: endpoints driven through the Flask test client from a pool of
+# threads, so routing, SQL, templates and the response cache are all in the measurement.
+
+RESPONSE_CACHE_SIZE = tracker.response_cache.maxsize
+
+CHECKLIST_ITEMS = ['wifi', 'bluetooth', 'joycon_left', 'joycon_right', 'game_card', 'sd_card', 'speakers', 'charging']
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def scenarios(units):
+    """name -> function(client, rng) issuing one request and returning the response."""
+    def random_unit(rng):
+        return unit_barcode(rng.randrange(units))
+
+    search_terms = [issue.split()[0] for issue in ISSUES] + OWNERS[:5] + ['XAW1', 'XKW1']
+    dashboard_etag = {}
+
+    def dashboard_revalidate(client, rng):
+        # A tablet re-opening the dashboard: conditional GET with the ETag it already has
+        etag = dashboard_etag.get('value')
+        if etag is None:
+            response = client.get('/')
+            dashboard_etag['value'] = response.headers.get('ETag')
+            return response
+        return client.get('/', headers={'If-None-Match': etag})
+
+    def checklist_post(client, rng):
+        items = {item: rng.random() < 0.5 for item in CHECKLIST_ITEMS}
+        return client.post(f'/api/unit/{random_unit(rng)}/checklist', json={'checklist': items})
+
+    return {
+        'dashboard': lambda client, rng: client.get('/'),
+        'dashboard_filtered': lambda client, rng: client.get(
+            '/', query_string={'status': 'active', 'model': rng.choice(['V1', 'Lite', 'OLED'])}),
+        'dashboard_revalidate': dashboard_revalidate,
+        'search': lambda client, rng: client.get('/api/search', query_string={'q': rng.choice(search_terms)}),
+        'next_label': lambda client, rng: client.get('/api/next-label?prefix=BN'),
+        'unit_page': lambda client, rng: client.get(f'/unit/{random_unit(rng)}'),
+        'checklist_post': checklist_post,
+    }
+
+def run_scenario(fn, requests, concurrency, seed):
+    """Issue `requests` calls of `fn` from `concurrency` threads, returns latency stats."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    per_thread = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = tracker.app.test_client()
+        local = []
+        failed = 0
+        try:
+            for _ in range(per_thread[index]):
+                start = time.perf_counter()
+                response = fn(client, rng)
+                local.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    failed += 1
+        finally:
+            close_connections()
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+    }
+
+def run_load(db_path, units, requests=200, concurrency=8, response_cache=True, only=None, seed=1):
+    """Run every scenario (or those in `only`) against the database at `db_path`."""
+    tracker.DATABASE = db_path
+    tracker.response_cache.clear()
+    tracker.response_cache.maxsize = RESPONSE_CACHE_SIZE if response_cache else 0
+    results = {}
+    for name, fn in scenarios(units).items():
+        if only and name not in only:
+            continue
+        results[name] = run_scenario(fn, requests, concurrency, seed)
+    close_connections()
+    return results
@@ -0,0 +1,52 @@
+import random
+import timeit
+from src.ssnc import check_serial, classify_serial
+from src.diagnostics import diagnose, parse_reading, _parse_reading, COMPILED_TABLES
+
+# Micro benchmarks: nanoseconds per call, best of REPEAT runs
+
+REPEAT = 5
+
+def sample_serials(rng, count):
+    prefixes = ['XAW1', 'XAW4', 'XAW7', 'XAJ1', 'XAJ4', 'XAJ7', 'XKW1', 'XJW1', 'XFL1', 'XTW1', 'XZZ1']
+    return [rng.choice(prefixes) + ''.join(rng.choice('0123456789') for _ in range(10)) for _ in range(count)]
+
+def sample_readings(rng, count):
+    forms = ['{a:.3f}A', '{m:.0f}mA', '{v:.1f}V {a:.3f}A', '{v:.2f}V/{m:.0f}mA', '{a:.3f}']
+    return [rng.choice(forms).format(a=rng.uniform(0, 3), m=rng.uniform(0, 3000), v=rng.uniform(0, 20))
+            for _ in range(count)]
+
+def time_per_call(fn, inputs, repeat=REPEAT):
+    """Best ns/call of `fn` over `inputs`."""
+    def run():
+        for value in inputs:
+            fn(value)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return round(best / len(inputs) * 1e9, 1)
+
+def time_cold(fn, cached, inputs, repeat=REPEAT):
+    """Like time_per_call, with `cached`'s lru_cache emptied before every run."""
+    results = []
+    for _ in range(repeat):
+        cached.cache_clear()
+        results.append(time_per_call(fn, inputs, repeat=1))
+    return min(results)
+
+def run_micro(count=20000, seed=1):
+    rng = random.Random(seed)
+    serials = sample_serials(rng, count)
+    readings = sample_readings(rng, count)
+    amps = [rng.uniform(0, 3) for _ in range(count)]
+    methods = list(COMPILED_TABLES)
+    pairs = [(rng.uniform(0, 20), a, rng.choice(methods)) for a in amps]
+
+    results = {
+        'check_serial_cold_ns': time_cold(check_serial, classify_serial, serials),
+        'check_serial_warm_ns': time_per_call(check_serial, serials),
+        'parse_reading_cold_ns': time_cold(parse_reading, _parse_reading, readings),
+        'parse_reading_warm_ns': time_per_call(parse_reading, readings),
+        'diagnose_ns': time_per_call(lambda p: diagnose(*p), pairs),
+    }
+    for method, index in COMPILED_TABLES.items():
+        results[f'table_lookup_{method}_ns'] = time_per_call(index.lookup, amps)
+    return results
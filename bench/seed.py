@@ -0,0 +1,65 @@
+import json
+import os
+import random
+from src.db import connect
+from src.migrations import migrate
+from src.intake import import_units
+
+# Synthetic repairs.db databases, built through the normal migration and import path
+# so indexes, triggers and summary tables look like a real shop's.
+
+STATUSES = ['Received', 'Diagnosing', 'Waiting for Parts', 'Repairing', 'Testing', 'Done', 'Delivered', 'Cancelled']
+ISSUES = ['No power', 'No charge', 'No display', 'Joy-Con rail', 'Fan noise', 'Game card slot', 'Water damage']
+OWNERS = ['Walk-in', 'eBay lot', 'Shop stock'] + [f'Customer {i}' for i in range(50)]
+# Free-text notes vary like real ones: a shared vocabulary of parts and symptoms, different mixes
+NOTE_WORDS = ('replaced', 'reflowed', 'cleaned', 'tested', 'checked', 'ordered', 'swapped', 'shorted', 'burnt',
+              'corroded', 'cracked', 'loose', 'missing', 'dead', 'intermittent', 'fuse', 'capacitor', 'coil',
+              'connector', 'flex', 'ribbon', 'battery', 'screen', 'digitizer', 'backlight', 'fan', 'heatsink',
+              'thermal', 'paste', 'port', 'pins', 'pad', 'trace', 'shield', 'speaker', 'headphone', 'jack',
+              'cartridge', 'reader', 'wifi', 'antenna', 'rail', 'latch', 'button', 'volume', 'power', 'chip',
+              'regulator', 'charger', 'dock', 'customer', 'warranty', 'quote', 'approved', 'waiting', 'parts')
+SERIAL_PREFIXES = ['XAW1', 'XAW4', 'XAW7', 'XAJ1', 'XAJ4', 'XAJ7', 'XKW1', 'XJW1', 'XTW1', 'XFL1']
+
+def unit_barcode(i):
+    return f'{SERIAL_PREFIXES[i % len(SERIAL_PREFIXES)]}{i:010d}'
+
+def synthetic_units(count, seed=1):
+    """(line number, record) pairs for import_units()."""
+    rng = random.Random(seed)
+    for i in range(count):
+        record = {
+            'barcode': unit_barcode(i),
+            'status': rng.choice(STATUSES),
+            'issue': rng.choice(ISSUES),
+            'owner': rng.choice(OWNERS),
+            'notes': ' '.join(rng.choice(NOTE_WORDS) for _ in range(rng.randint(3, 12))) + f' ref {rng.randrange(10**6):06d}',
+        }
+        if rng.random() < 0.2:
+            record['pin_check'] = json.dumps({str(pin): rng.choice(['OL', '0.45', '0.52', '0.70'])
+                                              for pin in range(1, 25)})
+        yield i + 1, record
+
+def seed_database(path, count, seed=1):
+    """Create (or reuse, if it already holds `count` units) a database at `path`."""
+    if os.path.exists(path):
+        db = connect(path)
+        try:
+            # Bring a database from an older run up to the current schema before reusing it
+            migrate(db)
+            if db.execute('SELECT COUNT(*) FROM units').fetchone()[0] == count:
+                return path
+        finally:
+            db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    db = connect(path)
+    try:
+        migrate(db)
+        import_units(db, synthetic_units(count, seed), lambda barcode: barcode, qwerty_mode='never')
+        db.execute('ANALYZE')
+        db.commit()
+    finally:
+        db.close()
+    return path
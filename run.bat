@@ -7,10 +7,12 @@ if %ERRORLEVEL% NEQ 0 (
     exit /b
 )
 
-echo Initializing database if needed...
-python -c "from src.app import init_db; import os; print('Database initialized') if not os.path.exists('repairs.db') else None"
-
-echo Starting Switch Repair Tracker...
 set PYTHONPATH=%PYTHONPATH%;%CD%
-python src/app.py
+if "%1"=="--dev" (
+    echo Starting development server...
+    python src/app.py --dev
+) else (
+    echo Starting Switch Repair Tracker...
+    python -m src.wsgi
+)
 pause
@@ -4,9 +4,11 @@ set -e
 echo "Installing dependencies..."
 pip install -r requirements.txt
 
-echo "Initializing database if needed..."
-python3 -c "from src.app import init_db; import os; print('Database initialized') if not os.path.exists('repairs.db') else None"
-
-echo "Starting Switch Repair Tracker..."
 export PYTHONPATH=$PYTHONPATH:$(pwd)
-python3 src/app.py
+if [ "$1" = "--dev" ]; then
+    echo "Starting development server..."
+    python3 src/app.py --dev
+else
+    echo "Starting Switch Repair Tracker..."
+    exec gunicorn -c python:src.gunicorn_conf src.wsgi:app
+fi
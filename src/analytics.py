@@ -0,0 +1,56 @@
+from src.migrations import STAT_DIMENSIONS, ANALYTICS_TRIGGERS, analytics_triggers, recompute_analytics, execute_script
+
+# Repair analytics read from summary tables that triggers keep up to date,
+# so the dashboard reads a handful of precomputed rows instead of scanning units.
+#
+# unit_stats    (dimension, key) -> units, closed   counts per status, model, owner, ...
+# status_time   status -> seconds, stays            completed stays in each status (from unit_events)
+# closed_daily  day -> closed                       units that reached a closed status that day
+
+# Statuses that no longer count as active work on the dashboard
+CLOSED_STATUSES = ('Done', 'Delivered', 'Cancelled')
+
+TOP_KEYS = 10
+CLOSED_DAYS = 30
+
+def rebuild_analytics(db):
+    """Recreate the triggers and recompute every summary table from units and unit_events.
+
+    Needed after CLOSED_STATUSES changes or if the tables were edited by hand. The tables
+    and triggers are the ones the migrations create (src/migrations.py). The caller commits.
+    """
+    for name in ANALYTICS_TRIGGERS:
+        db.execute(f'DROP TRIGGER IF EXISTS {name}')
+    execute_script(db, analytics_triggers(CLOSED_STATUSES, archive=True))
+    recompute_analytics(db, CLOSED_STATUSES, archive=True)
+
+def load_totals(db):
+    """(total units, units in progress) from the totals row."""
+    row = db.execute("SELECT units, closed FROM unit_stats WHERE dimension = 'all' AND key = ''").fetchone()
+    if row is None:
+        return 0, 0
+    return row['units'], row['units'] - row['closed']
+
+def load_dimension(db, dimension, limit=TOP_KEYS):
+    rows = db.execute('''
+        SELECT key, units, closed FROM unit_stats WHERE dimension = ? AND units > 0
+        ORDER BY units DESC, key LIMIT ?
+    ''', (dimension, limit))
+    return [{'key': r['key'], 'units': r['units'], 'closed': r['closed']} for r in rows]
+
+def load_analytics(db, limit=TOP_KEYS):
+    """Everything the analytics panel and API show, read from the summary tables."""
+    total, in_progress = load_totals(db)
+    status_time = [
+        {'status': r['status'], 'stays': r['stays'], 'avg_hours': round(r['seconds'] / r['stays'] / 3600, 1)}
+        for r in db.execute('SELECT status, seconds, stays FROM status_time WHERE stays > 0 ORDER BY status')
+    ]
+    closed_daily = [dict(r) for r in db.execute(
+        "SELECT day, closed FROM closed_daily WHERE day >= date('now', ?) ORDER BY day",
+        (f'-{CLOSED_DAYS} days',))]
+    return {
+        'totals': {'units': total, 'in_progress': in_progress, 'closed': total - in_progress},
+        'by': {d: load_dimension(db, d, limit) for d in STAT_DIMENSIONS},
+        'status_time': status_time,
+        'closed_daily': closed_daily,
+    }
@@ -1,61 +1,560 @@
-from flask import Flask, render_template, request, jsonify, g, redirect, url_for
-import sqlite3
+from flask import (Flask, render_template, request, jsonify, g, redirect, url_for, Response, stream_with_context,
+                   get_template_attribute, before_render_template, template_rendered)
 import os
-from src.diagnostics import DIAGNOSTIC_TABLES, parse_reading
-from src.ssnc import check_serial
+import re
+import sys
+import json
+import queue
+import sqlite3
+import time
+import threading
+import hmac
+import urllib.error
+import cProfile
+import click
+from datetime import datetime, timezone
+from functools import wraps
+from src.diagnostics import diagnose, parse_reading, _parse_reading, StageTimeline
+from src.ssnc import check_serial, classify_serial
+from src.db import connect, get_connection, release_connection
+from src.migrations import migrate, execute_script, SEARCH_INDEX
+from src.labels import allocate_label, observe_label
+from src.records import detect_format, text_lines, iter_records
+from src.intake import import_units, export_units, QWERTY_MODES
+from src.metrics import Counter, Histogram, cache_info_gauge, render_metrics
+from src.cache import ResponseCache, data_generation, file_hash, tree_hash
+from src.analytics import CLOSED_STATUSES, rebuild_analytics, load_analytics, load_totals
+from src.feed import ChangeFeed, changes_since, MAX_BATCH, RESYNC
+from src.lookup import fix_qwerty, resolve_unit, LOOKUP_BARCODE
+from src.archive import archive_units, count_archivable, find_archived, load_archived, restore_unit, compact
+from src.sync import collect_changes, apply_changes, sync, DatabasePeer, HttpPeer, SYNC_BATCH
+from src.checks import (parse_pin_check, save_pin_readings, clear_pin_readings, pin_check_json,
+                        load_checklist, update_checklist, checklist_version, bump_checklist_version,
+                        RIPPED_OFF_OL_COUNT)
 
 app = Flask(__name__)
-DATABASE = 'repairs.db'
+DATABASE = os.environ.get('DATABASE', 'repairs.db')
+# Closed units untouched for this many days move to the archive (flask archive-units)
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+# Shared secret for /api/sync/*, sent as 'Authorization: Bearer <token>'. Unset disables those endpoints.
+SYNC_TOKEN = os.environ.get('SYNC_TOKEN')
 
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        # Pooled per-thread connection (WAL, busy timeout, statement cache), see src/db.py
+        db = g._database = get_connection(DATABASE)
     return db
 
 @app.teardown_appcontext
 def close_connection(exception):
     db = getattr(g, '_database', None)
     if db is not None:
-        db.close()
+        release_connection(db)
+
+# Instrumentation, exposed on /metrics (src/metrics.py, per-query timing in src/db.py)
+REQUEST_SECONDS = Histogram('http_request_seconds', 'Request latency until the response is ready',
+                            ('endpoint', 'method', 'status'))
+TEMPLATE_SECONDS = Histogram('template_render_seconds', 'Jinja template render time', ('template',))
+SECTION_SECONDS = Histogram('section_seconds', 'Time spent in hot code paths', ('section',))
+RESPONSE_CACHE_REQUESTS = Counter('response_cache_requests_total', 'Cached GET lookups', ('result',))
+cache_info_gauge('lru_cache', 'lru_cache statistics of the serial and reading parsers',
+                 {'classify_serial': classify_serial, 'parse_reading': _parse_reading})
+
+# Opt-in cProfile of single requests: PROFILE_REQUESTS=header profiles requests sent with
+# 'X-Profile: 1', =all profiles everything. Stats are written to PROFILE_DIR as .prof files.
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g._template_start = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def record_template_time(sender, template, context, **extra):
+    start = g.pop('_template_start', None)
+    if start is not None:
+        TEMPLATE_SECONDS.observe(time.perf_counter() - start, template.name)
+
+@app.before_request
+def start_request_timer():
+    g._request_start = time.perf_counter()
+    if PROFILE_REQUESTS == 'all' or (PROFILE_REQUESTS == 'header' and request.headers.get('X-Profile') == '1'):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already running in this process
+            return
+        g._profiler = profiler
+
+def save_profile(profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.endpoint or 'unmatched'}.prof"
+    path = os.path.join(PROFILE_DIR, name)
+    profiler.dump_stats(path)
+    app.logger.info('Profiled %s %s -> %s', request.method, request.path, path)
+    return path
+
+@app.after_request
+def record_request(response):
+    profiler = g.pop('_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        response.headers['X-Profile-File'] = save_profile(profiler)
+    start = g.pop('_request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unmatched', request.method,
+                                str(response.status_code))
+    return response
+
+@app.teardown_request
+def record_failed_request(exception):
+    # after_request is skipped when the view raised
+    profiler = g.pop('_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    start = g.pop('_request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unmatched', request.method, '500')
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of this process's metrics."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 def init_db():
+    """Create the database or upgrade it to the latest schema version."""
+    with app.app_context():
+        applied = migrate(get_db())
+        for name in applied:
+            print(f"Applied migration {name}")
+        return applied
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    if not init_db():
+        print("Database is up to date.")
+
+def rebuild_search_index():
+    """Create the FTS index if missing and re-index every unit (for existing databases)."""
     with app.app_context():
         db = get_db()
-        with app.open_resource('schema.sql', mode='r') as f:
-            db.cursor().executescript(f.read())
+        execute_script(db, SEARCH_INDEX)
+        db.execute("INSERT INTO units_fts(units_fts) VALUES ('rebuild')")
         db.commit()
 
-def fix_qwerty(barcode):
-    """Convert QWERTY-scanned barcode to AZERTY equivalent"""
-    qwerty_map = {
-        'A': 'Q', 'Q': 'A', 'Z': 'W', 'W': 'Z',
-        'a': 'q', 'q': 'a', 'z': 'w', 'w': 'z',
-        'm': ',', ',': 'm', 'M': '?', '?': 'M',
-        '&': '1', 'é': '2', '"': '3', "'": '4', '(': '5', 
-        '-': '6', 'è': '7', '_': '8', 'ç': '9', 'à': '0',
-        ')': '-', '=': '='
-    }
-    return ''.join(qwerty_map.get(char, char) for char in barcode)
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text search index."""
+    rebuild_search_index()
+    print("Search index rebuilt.")
+
+def rebuild_analytics_tables():
+    """Recompute the analytics summary tables from units and unit_events."""
+    with app.app_context():
+        db = get_db()
+        rebuild_analytics(db)
+        db.commit()
+
+@app.cli.command('rebuild-analytics')
+def rebuild_analytics_command():
+    """Rebuild the analytics summary tables."""
+    rebuild_analytics_tables()
+    print("Analytics rebuilt.")
+
+@app.cli.command('archive-units')
+@click.option('--days', type=int, default=ARCHIVE_AFTER_DAYS, show_default=True,
+              help='Archive closed units not updated for this many days.')
+@click.option('--dry-run', is_flag=True, help='Only count the units that would move.')
+@click.option('--compact', 'compact_after', is_flag=True, help='Run compact-db afterwards.')
+def archive_units_command(days, dry_run, compact_after):
+    """Move old Done/Delivered/Cancelled units to the archive."""
+    db = get_db()
+    if dry_run:
+        print(f"{count_archivable(db, days)} units would be archived.")
+        return
+    print(f"Archived {archive_units(db, days)} units.")
+    if compact_after:
+        compact(db)
+        print("Database compacted.")
+
+@app.cli.command('restore-unit')
+@click.argument('barcode')
+def restore_unit_command(barcode):
+    """Move an archived unit back to the active list."""
+    db = get_db()
+    if restore_unit(db, barcode) is None:
+        print(f"{barcode} is not archived.")
+        return
+    db.commit()
+    print(f"Restored {barcode}.")
+
+@app.cli.command('sync')
+@click.argument('peer')
+@click.option('--batch', type=int, default=SYNC_BATCH, show_default=True, help='Units per change set.')
+@click.option('--token', envvar='SYNC_TOKEN', help='The peer server\'s SYNC_TOKEN (for URLs).')
+def sync_command(peer, batch, token):
+    """Exchange unit changes with PEER, another repairs.db path or a tracker URL."""
+    db = get_db()
+    if peer.startswith(('http://', 'https://')):
+        if not token:
+            raise click.UsageError('Syncing with a server needs its SYNC_TOKEN (--token or the environment).')
+        name, remote = peer.rstrip('/'), HttpPeer(peer, token)
+    else:
+        if not os.path.exists(peer):
+            raise click.BadParameter(f'{peer} does not exist', param_hint='PEER')
+        remote_db = connect(peer)
+        migrate(remote_db)
+        name, remote = os.path.abspath(peer), DatabasePeer(remote_db)
+    try:
+        totals = sync(db, remote, name, batch)
+    except urllib.error.URLError as e:
+        # Batches synced so far are kept, the next run resumes from there
+        raise click.ClickException(f'Sync with {peer} failed: {e}')
+    for direction, stats in totals.items():
+        print(f"{direction}: {stats['applied']} applied, {stats['deleted']} deleted, {stats['skipped']} unchanged or older")
+    # Both directions report the same pair
+    conflicts = {(c['label'], *sorted((c['barcode'], c['local_barcode'])))
+                 for stats in totals.values() for c in stats['label_conflicts']}
+    for label, first, second in sorted(conflicts):
+        print(f"Label {label} is used by both {first} and {second}, relabel one of them")
+
+@app.cli.command('compact-db')
+def compact_db_command():
+    """Optimize the search indexes, ANALYZE and VACUUM the database."""
+    db = get_db()
+    size = os.path.getsize(DATABASE)
+    compact(db)
+    print(f"Compacted {DATABASE}: {size // 1024} KiB -> {os.path.getsize(DATABASE) // 1024} KiB")
+
+def fts_query(text):
+    """Turn free text into an FTS5 MATCH expression, None if nothing is searchable.
+
+    Each word becomes a quoted phrase (so user input can't inject FTS syntax).
+    The trigram tokenizer can't match words shorter than 3 characters, those are dropped.
+    """
+    terms = [t for t in text.split() if len(t) >= 3]
+    if not terms:
+        return None
+    return ' '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+# Dashboard list view: keep heavy blobs (notes, testing_checklist) out of the page
+PAGE_SIZE = 50
+LIST_COLUMNS = '''id, barcode, label, model, type, issue, status, patch_status, pin_check,
+    pin_reading_count, pin_ol_count, pin_unexpected_ol, condition_notes, owner, modchip, updated_at'''
+
+# Pushes unit changes to open dashboards, see src/feed.py
+change_feed = ChangeFeed(DATABASE, LIST_COLUMNS)
+
+def build_unit_filters(args):
+    """Translate dashboard query args into a WHERE clause and its parameters."""
+    clauses = []
+    params = []
+
+    status = args.get('status', '').strip()
+    if status == 'active':
+        clauses.append("COALESCE(status, '') NOT IN (%s)" % ', '.join('?' * len(CLOSED_STATUSES)))
+        params.extend(CLOSED_STATUSES)
+    elif status:
+        clauses.append('status = ?')
+        params.append(status)
+
+    model = args.get('model', '').strip()
+    if model:
+        clauses.append('model LIKE ?')
+        params.append(f'%{model}%')
+
+    owner = args.get('owner', '').strip()
+    if owner:
+        clauses.append('owner LIKE ?')
+        params.append(f'%{owner}%')
+
+    # Universal filter, replaces the old client-side textContent scan
+    q = args.get('q', '').strip()
+    match = fts_query(q)
+    if match:
+        clauses.append('id IN (SELECT rowid FROM units_fts WHERE units_fts MATCH ?)')
+        params.append(match)
+    elif q:
+        fields = ('barcode', 'label', 'model', 'issue', 'owner', 'notes', 'condition_notes', 'patch_status', 'status')
+        clauses.append('(' + ' OR '.join(f'{f} LIKE ?' for f in fields) + ')')
+        params.extend([f'%{q}%'] * len(fields))
+
+    return clauses, params
+
+def encode_cursor(row):
+    return f"{row['updated_at']}|{row['id']}"
+
+def decode_cursor(cursor):
+    """Split an 'updated_at|id' cursor, returns None if it is malformed."""
+    if not cursor or '|' not in cursor:
+        return None
+    updated_at, _, unit_id = cursor.rpartition('|')
+    try:
+        return updated_at, int(unit_id)
+    except ValueError:
+        return None
+
+# Rendered GET responses, reused until the data they were built from changes
+response_cache = ResponseCache(maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 256)),
+                               ttl=int(os.environ.get('RESPONSE_CACHE_TTL', 300)))
+
+# Salts page ETags, so a deploy with new templates or assets never gets a stale 304
+BUILD_HASH = tree_hash(os.path.join(app.root_path, app.template_folder), app.static_folder)
+
+# Fingerprinted static URLs never change content, browsers may keep them for a year
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+@app.url_defaults
+def hashed_static_url(endpoint, values):
+    """url_for('static', ...) gets ?v=<content hash>, so assets can be cached as immutable."""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        digest = file_hash(os.path.join(app.static_folder, values['filename']))
+        if digest:
+            values['v'] = digest
+
+@app.after_request
+def static_cache_headers(response):
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        version = request.args.get('v')
+        filename = (request.view_args or {}).get('filename', '')
+        # Only the current hash is immutable, an old ?v= from a stale page is revalidated as usual
+        if version and version == file_hash(os.path.join(app.static_folder, filename)):
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+    return response
+
+def parse_timestamp(value):
+    """SQLite CURRENT_TIMESTAMP text (UTC) as an aware datetime, None if missing."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+def generation_validator(db, *args, **kwargs):
+    """Pages that depend on many units change with any unit write.
+
+    No Last-Modified: archiving, deleting and checklist writes move the generation but
+    not MAX(updated_at). The UTC date is part of the tag because the dashboard's and
+    analytics' closed-per-day window is relative to today.
+    """
+    today = datetime.now(timezone.utc).date().isoformat()
+    return f'g{data_generation(db)}.{today}', None
+
+def unit_validator(db, barcode):
+    """A unit page only changes with its own row, whose version is bumped on every save."""
+    row = db.execute('SELECT id, version, updated_at FROM units WHERE barcode = ?', (barcode,)).fetchone()
+    if row is None:
+        # Archived units can only change by being restored, which takes them out of units_archive
+        row = db.execute('SELECT id, version, updated_at FROM units_archive WHERE barcode = ?', (barcode,)).fetchone()
+        if row is None:
+            # Redirects and pre-filled pages for new scans are not cached
+            return None
+        return f'a{row["id"]}.{row["version"]}', parse_timestamp(row['updated_at'])
+    return f'u{row["id"]}.{row["version"]}', parse_timestamp(row['updated_at'])
+
+def cached_get(validator):
+    """Serve a GET view from response_cache and answer conditional requests with 304.
+
+    `validator(db, **view_args)` returns (tag, last_modified) for the data the
+    page is built from (last_modified may be None), or None to bypass the cache. The tag is both the ETag
+    and the cache entry's generation, so a write invalidates both at once.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            validators = validator(get_db(), *args, **kwargs)
+            if validators is None:
+                return view(*args, **kwargs)
+            tag, last_modified = validators
+            etag = f'{tag}-{BUILD_HASH}'
+
+            if request.if_none_match.contains(etag):
+                # The client's copy is current, skip the cache and the view altogether
+                RESPONSE_CACHE_REQUESTS.inc('not_modified')
+                response = app.response_class(status=304)
+            else:
+                cached = response_cache.get(request.full_path, etag)
+                RESPONSE_CACHE_REQUESTS.inc('miss' if cached is None else 'hit')
+                if cached is None:
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    response_cache.put(request.full_path, etag, (response.get_data(), response.mimetype))
+                else:
+                    response = app.response_class(cached[0], mimetype=cached[1])
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Always revalidate, which is cheap: one indexed lookup and usually a 304
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
 
 @app.route('/')
+@cached_get(generation_validator)
 def index():
     db = get_db()
-    cursor = db.execute('SELECT * FROM units ORDER BY updated_at DESC')
-    units = cursor.fetchall()
-    
-    # Simple stats
-    total = len(units)
-    in_progress = sum(1 for u in units if u['status'] not in ('Done', 'Delivered', 'Cancelled'))
-    
-    return render_template('index.html', units=units, total=total, in_progress=in_progress)
+
+    # Live updates start from the data this page shows
+    feed_seq = data_generation(db)
+    # Totals and the analytics panel read the trigger-maintained summary tables (src/analytics.py)
+    analytics = load_analytics(db)
+
+    clauses, params = build_unit_filters(request.args)
+
+    # Keyset pagination on (updated_at, id): 'after' walks to older rows, 'before' back to newer ones
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before')) if not after else None
+    if after:
+        clauses.append('(updated_at, id) < (?, ?)')
+        params.extend(after)
+        order = 'updated_at DESC, id DESC'
+    elif before:
+        clauses.append('(updated_at, id) > (?, ?)')
+        params.extend(before)
+        order = 'updated_at ASC, id ASC'
+    else:
+        order = 'updated_at DESC, id DESC'
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    # Fetch one extra row to know whether another page exists
+    rows = db.execute(
+        f'SELECT {LIST_COLUMNS} FROM units {where} ORDER BY {order} LIMIT ?',
+        params + [PAGE_SIZE + 1]
+    ).fetchall()
+
+    has_more = len(rows) > PAGE_SIZE
+    units = rows[:PAGE_SIZE]
+    if before:
+        units.reverse()
+
+    # Links keep the active filters and swap the cursor
+    filters = {k: v for k, v in request.args.items() if k not in ('after', 'before') and v}
+    next_cursor = prev_cursor = None
+    if units:
+        if has_more or before:
+            next_cursor = encode_cursor(units[-1])
+        if (has_more and before) or after:
+            prev_cursor = encode_cursor(units[0])
+
+    # The universal filter also looks through the archive, below the first page
+    q = request.args.get('q', '').strip()
+    archived = search_archive(db, q, SEARCH_LIMIT) if q and not after and not before else []
+
+    return render_template('index.html', units=units, total=analytics['totals']['units'], archived=archived,
+                           in_progress=analytics['totals']['in_progress'], analytics=analytics,
+                           feed_seq=feed_seq, page_size=PAGE_SIZE, filters=filters, next_cursor=next_cursor, prev_cursor=prev_cursor,
+                           ripped_off_ol_count=RIPPED_OFF_OL_COUNT)
+
+# Seconds between keep-alive comments, also how soon a closed connection frees its thread
+FEED_HEARTBEAT = 15
+# How long browsers wait before reconnecting a dropped feed
+FEED_RETRY_MS = 3000
+# Open feeds each hold a thread for as long as the screen stays open, so they get their own
+# budget on top of THREADS (gunicorn_conf.py and wsgi.py add it to the thread count).
+# Screens past it are answered like a poll: pending changes, then the browser is told
+# to reconnect in FEED_POLL_MS, and page requests never wait behind idle streams.
+STREAM_THREADS = int(os.environ.get('STREAM_THREADS', 32))
+FEED_POLL_MS = 15000
+stream_slots = threading.BoundedSemaphore(STREAM_THREADS)
+
+def feed_event(db, rows, filters):
+    """SSE 'units' event: changed rows rendered as on the dashboard, flagged with whether they match its filters."""
+    ids = [row['id'] for row in rows]
+    clauses, params = build_unit_filters(filters)
+    clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+    matching = {r[0] for r in db.execute(f"SELECT id FROM units WHERE {' AND '.join(clauses)}", params + ids)}
+
+    render_row = get_template_attribute('_unit_row.html', 'unit_row')
+    latest = {}
+    for row in rows:
+        # A unit saved twice in one batch is sent once, as it is now
+        latest[row['barcode']] = row
+    units = [{'barcode': barcode, 'matches': row['id'] in matching,
+              'html': str(render_row(row, RIPPED_OFF_OL_COUNT))} for barcode, row in latest.items()]
+    total, in_progress = load_totals(db)
+    data = json.dumps({'units': units, 'totals': {'units': total, 'in_progress': in_progress}})
+    return f"id: {rows[-1]['change_seq']}\nevent: units\ndata: {data}\n\n"
+
+@app.route('/api/events')
+def events():
+    """Server-Sent Events feed of unit changes for the dashboard.
+
+    Query args are the dashboard's filters. `since` (or the Last-Event-ID header
+    on reconnect) is the change_seq the page was rendered at, anything newer is
+    sent first so nothing is missed between page load and connect.
+    """
+    filters = request.args.to_dict()
+    since = request.headers.get('Last-Event-ID') or filters.pop('since', None)
+    try:
+        sent = int(since) if since is not None else None
+    except ValueError:
+        sent = None
+
+    def generate():
+        nonlocal sent
+        db = get_db()
+        # Slot and subscription are taken only once the response streams: a generator that
+        # never starts never runs its finally, and they would stay taken for good
+        streaming = stream_slots.acquire(blocking=False)
+        subscription = change_feed.subscribe() if streaming else None
+        try:
+            yield f'retry: {FEED_RETRY_MS if streaming else FEED_POLL_MS}\n\n'
+            if sent is None:
+                sent = data_generation(db)
+                if not streaming:
+                    # The browser resumes from here when it reconnects
+                    yield f'id: {sent}\n\n'
+            else:
+                rows = changes_since(db, sent, LIST_COLUMNS)
+                if len(rows) == MAX_BATCH:
+                    # Too far behind to patch rows one by one
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                if rows:
+                    yield feed_event(db, rows, filters)
+                    sent = rows[-1]['change_seq']
+            if not streaming:
+                return
+            while True:
+                try:
+                    rows = subscription.get(timeout=FEED_HEARTBEAT)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if rows is RESYNC:
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                rows = [row for row in rows if row['change_seq'] > sent]
+                if rows:
+                    yield feed_event(db, rows, filters)
+                    sent = rows[-1]['change_seq']
+        finally:
+            if streaming:
+                change_feed.unsubscribe(subscription)
+                stream_slots.release()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/unit/<barcode>', methods=['GET', 'POST'])
+@cached_get(unit_validator)
 def unit_detail(barcode):
     db = get_db()
     
     if request.method == 'POST':
+        # Saving an archived unit brings it back to the active list first (same transaction)
+        restore_unit(db, barcode)
+
         model = request.form.get('model')
         issue = request.form.get('issue')
         status = request.form.get('status')
@@ -79,9 +578,10 @@ def unit_detail(barcode):
         # However, for 'Console' type, we can re-verify patch status if model changed?
         # Simpler: If it's a console and we have a serial, update patch status based on serial
         patch_status = None
+        info = None
         if unit_type == 'Console':
-            from ssnc import check_serial
-            info = check_serial(barcode)
+            with SECTION_SECONDS.time('check_serial'):
+                info = check_serial(barcode)
             # Only overwrite if valid info found or to keep in sync
             if info['patch_status'] != 'Unknown':
                patch_status = info['patch_status']
@@ -94,65 +594,97 @@ def unit_detail(barcode):
                 # Fallback if model was empty
                 model = info['model']
 
-        # Check if exists
-        exists = db.execute('SELECT id FROM units WHERE barcode = ?', (barcode,)).fetchone()
-        
-        if exists:
-            query = '''
-                UPDATE units SET model = ?, issue = ?, status = ?, notes = ?, label = ?, type = ?, 
-                pin_check = ?, usb_c_reading = ?, amp_draw = ?, condition_notes = ?, owner = ?, modchip = ?,
-                updated_at = CURRENT_TIMESTAMP
-            '''
-            params = [model, issue, status, notes, label, unit_type, pin_check, usb_c_reading, amp_draw, condition_notes, owner, modchip]
-            
-            if patch_status:
-                query += ', patch_status = ?'
-                params.append(patch_status)
-                
-            query += ' WHERE barcode = ?'
-            params.append(barcode)
-            
-            db.execute(query, params)
+        # Pin tester JSON goes to unit_pin_readings, only legacy free text stays in pin_check
+        pin_readings = parse_pin_check(pin_check)
+        if pin_readings is not None:
+            pin_check = None
+
+        # New units store the serial's patch status even when it is 'Unknown',
+        # updates only overwrite it with a definite answer
+        insert_patch_status = patch_status or (info['patch_status'] if info else None)
+
+        # Version the form was rendered from: missing (old clients) skips the check,
+        # empty means the page was a draft for a unit that didn't exist yet
+        form_version = request.form.get('version')
+        if form_version is None:
+            expected_version = None
+        else:
+            try:
+                expected_version = int(form_version)
+            except ValueError:
+                expected_version = -1
+
+        # Single upsert instead of check-then-write. The WHERE on DO UPDATE is the
+        # optimistic lock: when someone saved in between, nothing is written and no row comes back.
+        row = db.execute('''
+            INSERT INTO units (barcode, model, issue, status, notes, label, type, patch_status,
+            pin_check, usb_c_reading, amp_draw, condition_notes, owner, modchip)
+            VALUES (:barcode, :model, :issue, :status, :notes, :label, :type, :insert_patch_status,
+            :pin_check, :usb_c_reading, :amp_draw, :condition_notes, :owner, :modchip)
+            ON CONFLICT(barcode) DO UPDATE SET model = excluded.model, issue = excluded.issue,
+            status = excluded.status, notes = excluded.notes, label = excluded.label, type = excluded.type,
+            patch_status = COALESCE(:patch_status, units.patch_status), pin_check = excluded.pin_check,
+            usb_c_reading = excluded.usb_c_reading, amp_draw = excluded.amp_draw,
+            condition_notes = excluded.condition_notes, owner = excluded.owner, modchip = excluded.modchip,
+            version = units.version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE :expected_version IS NULL OR units.version = :expected_version
+            RETURNING id
+        ''', {
+            'barcode': barcode, 'model': model, 'issue': issue, 'status': status, 'notes': notes,
+            'label': label, 'type': unit_type, 'patch_status': patch_status,
+            'insert_patch_status': insert_patch_status, 'pin_check': pin_check,
+            'usb_c_reading': usb_c_reading, 'amp_draw': amp_draw, 'condition_notes': condition_notes,
+            'owner': owner, 'modchip': modchip, 'expected_version': expected_version
+        }).fetchone()
+
+        if row is None:
+            # Lost the race: show the saved unit and what this form would have changed
+            db.rollback()
+            current = db.execute('SELECT * FROM units WHERE barcode = ?', (barcode,)).fetchone()
+            if current is not None:
+                current_pin_check = pin_check_json(db, current['id']) or current['pin_check'] or ''
+            else:
+                # An archived unit: the rollback undid its restore, compare with the archived row
+                current, _, current_pin_check = load_archived(
+                    db.execute('SELECT * FROM units_archive WHERE barcode = ?', (barcode,)).fetchone())
+            submitted = {'model': model, 'issue': issue, 'status': status, 'notes': notes, 'label': label,
+                         'type': unit_type, 'usb_c_reading': usb_c_reading, 'amp_draw': amp_draw,
+                         'condition_notes': condition_notes, 'owner': owner, 'modchip': modchip}
+            conflicts = [(field, value) for field, value in submitted.items()
+                         if (value or None) != (current[field] or None)]
+            return render_template('unit.html', barcode=barcode, unit=current, pin_check=current_pin_check,
+                                   conflicts=conflicts), 409
+        unit_id = row['id']
+
+        if pin_readings is not None:
+            save_pin_readings(db, unit_id, pin_readings, unit_type)
         else:
-            # New unit logic
-            if not patch_status and unit_type == 'Console':
-                 from ssnc import check_serial
-                 info = check_serial(barcode)
-                 patch_status = info['patch_status']
-                 if not model and info['model'] != 'Unknown':
-                     model = info['model']
-
-            db.execute('''
-                INSERT INTO units (barcode, model, issue, status, notes, label, type, patch_status,
-                pin_check, usb_c_reading, amp_draw, condition_notes, owner, modchip)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (barcode, model, issue, status, notes, label, unit_type, patch_status, 
-                  pin_check, usb_c_reading, amp_draw, condition_notes, owner, modchip))
+            clear_pin_readings(db, unit_id)
             
+        # Keep the label counter ahead of hand-typed labels
+        observe_label(db, label)
         db.commit()
+        change_feed.notify()
         return redirect(url_for('unit_detail', barcode=barcode))
 
-    unit = db.execute('SELECT * FROM units WHERE barcode = ?', (barcode,)).fetchone()
-    
-    # If not found by barcode, check if it matches a label and redirect
-    if not unit:
-        # Some barcodes might be labels (like 'SW023'), let's try to match it
-        unit_by_label = db.execute('SELECT * FROM units WHERE label = ?', (barcode,)).fetchone()
-        if unit_by_label:
-            return redirect(url_for('unit_detail', barcode=unit_by_label['barcode']))
+    # Barcode, label (like 'SW023') or a barcode scanned on the wrong keyboard layout,
+    # resolved in one indexed query (src/lookup.py)
+    unit = resolve_unit(db, barcode)
+    if unit and unit['kind'] != LOOKUP_BARCODE:
+        # Redirect to the correct barcode
+        return redirect(url_for('unit_detail', barcode=unit['barcode']))
 
-    # If not found, try QWERTY-fixed version
     if not unit:
-        fixed_barcode = fix_qwerty(barcode)
-        if fixed_barcode != barcode:  # Only if translation actually changed something
-            unit_fixed = db.execute('SELECT * FROM units WHERE barcode = ?', (fixed_barcode,)).fetchone()
-            if unit_fixed:
-                # Redirect to the correct barcode
-                return redirect(url_for('unit_detail', barcode=fixed_barcode))
+        # Finished units that were archived (src/archive.py)
+        archived = find_archived(db, barcode)
+        if archived and archived['barcode'] != barcode:
+            return redirect(url_for('unit_detail', barcode=archived['barcode']))
+        if archived:
+            unit, _, pin_check = load_archived(archived)
+            return render_template('unit.html', barcode=barcode, unit=unit, pin_check=pin_check)
     
     # Auto-filling for new scans (GET request for non-existent unit)
     if not unit:
-        from ssnc import check_serial
         info = check_serial(barcode)
         # Create a dummy unit dict for properly pre-filling the template
         unit = {
@@ -169,48 +701,76 @@ def unit_detail(barcode):
              # Actually template uses `unit.model` if unit else ...
              # We can pass `prefill` data
 
-    return render_template('unit.html', barcode=barcode, unit=unit)
+    # The pin tester still reads/writes JSON through its hidden input
+    if 'id' in unit.keys():
+        pin_check = pin_check_json(db, unit['id']) or unit['pin_check'] or ''
+    else:
+        pin_check = ''
+
+    return render_template('unit.html', barcode=barcode, unit=unit, pin_check=pin_check)
+
+SEARCH_COLUMNS = 'u.barcode, u.label, u.model, u.type, u.status, u.issue, u.owner, u.patch_status, u.updated_at'
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+ARCHIVE_SEARCH_COLUMNS = 'a.barcode, a.label, a.model, a.type, a.status, a.issue, a.owner, a.patch_status, a.updated_at'
+
+def search_archive(db, query, limit):
+    """Archived units matching `query` (see src/archive.py), the same columns as live search results."""
+    match = fts_query(query)
+    if match:
+        return db.execute(
+            f'SELECT {ARCHIVE_SEARCH_COLUMNS} FROM units_archive_fts JOIN units_archive a ON a.id = units_archive_fts.rowid '
+            'WHERE units_archive_fts MATCH ? ORDER BY units_archive_fts.rank LIMIT ?',
+            (match, limit)
+        ).fetchall()
+    return db.execute(
+        f'SELECT {ARCHIVE_SEARCH_COLUMNS} FROM units_archive a WHERE a.barcode LIKE ? OR a.label LIKE ? '
+        'ORDER BY a.updated_at DESC LIMIT ?',
+        (query + '%', query + '%', limit)
+    ).fetchall()
 
 @app.route('/api/search')
+@cached_get(generation_validator)
 def search():
-    query = request.args.get('q')
+    query = request.args.get('q', '').strip()
     if not query:
         return jsonify([])
+    limit = max(1, min(request.args.get('limit', SEARCH_LIMIT, type=int) or SEARCH_LIMIT, SEARCH_MAX_LIMIT))
     db = get_db()
-    # Simple search by barcode, model or label
-    cursor = db.execute("SELECT * FROM units WHERE barcode LIKE ? OR model LIKE ? OR label LIKE ?", ('%'+query+'%', '%'+query+'%', '%'+query+'%'))
+
+    match = fts_query(query)
+    if match:
+        # Ranked full-text search over barcode, label, model, issue, notes, owner and condition notes
+        cursor = db.execute(
+            f'SELECT {SEARCH_COLUMNS} FROM units_fts JOIN units u ON u.id = units_fts.rowid '
+            'WHERE units_fts MATCH ? ORDER BY units_fts.rank LIMIT ?',
+            (match, limit)
+        )
+    else:
+        # Too short for trigrams (e.g. 'SW'), fall back to a prefix match on identifiers
+        cursor = db.execute(
+            f'SELECT {SEARCH_COLUMNS} FROM units u WHERE u.barcode LIKE ? OR u.label LIKE ? '
+            'ORDER BY u.updated_at DESC LIMIT ?',
+            (query + '%', query + '%', limit)
+        )
     results = [dict(row) for row in cursor.fetchall()]
+    if len(results) < limit:
+        # Archived units fill up the rest, after the active ones
+        results += [dict(row, archived=True) for row in search_archive(db, query, limit - len(results))]
     return jsonify(results)
 
 @app.route('/api/next-label')
 def next_label():
-    prefix = request.args.get('prefix', 'SW').upper()
+    prefix = request.args.get('prefix', 'SW').strip().upper() or 'SW'
+    if not prefix.isalpha():
+        return jsonify({'error': 'Prefix must be letters only'}), 400
     db = get_db()
-    
-    # Find all labels starting with prefix (case insensitive)
-    # Ensure we only match the exact prefix followed by numbers to avoid confusion 
-    # (e.g. if we have SW and SWX, though likely just SW/DK)
-    cursor = db.execute("SELECT label FROM units WHERE label LIKE ?", (f'{prefix}%',))
-    rows = cursor.fetchall()
-    
-    max_num = 0
-    for row in rows:
-        label = row['label']
-        # Extract number part
-        try:
-            # Remove prefix and convert to int
-            # Verify the start matches to be safe
-            if label.upper().startswith(prefix):
-                num_part = label[len(prefix):]
-                num = int(num_part)
-                if num > max_num:
-                    max_num = num
-        except ValueError:
-            continue
-            
-    next_num = max_num + 1
+
+    # One counter row per prefix, incremented atomically: constant cost and no duplicates
     # Format as {PREFIX}{003d} -> e.g. SW023, DK005
-    return jsonify({'next_label': f"{prefix}{next_num:03d}"})
+    label = allocate_label(db, prefix)
+    db.commit()
+    return jsonify({'next_label': label})
 
 @app.route('/api/diagnose-boot', methods=['POST'])
 def diagnose_boot():
@@ -218,141 +778,273 @@ def diagnose_boot():
     amp_str = data.get('amp_draw', '').strip()
     test_method = data.get('test_method', 'battery')
     
-    # Parse reading (Volts and Amps)
-    volts, amp_val = parse_reading(amp_str)
-    
-    # Get table for method
-    table = DIAGNOSTIC_TABLES.get(test_method, DIAGNOSTIC_TABLES['battery'])
-    
-    # Precise Voltage/Method Logic (Overrides)
-    result = None
-    
-    if test_method == 'no_battery':
-        if volts is not None and volts >= 12.0:
-            # 15V Detected (Charging Enabled)
-            if amp_val <= 0.08:
-                result = {
-                    'range': (0.00, 0.08),
-                    'stage': '15V Healthy Idle',
-                    'fault': 'None (Normal)',
-                    'action': f'15V Negotiated. Low draw ({amp_val}A) is normal behavior without battery.',
-                    'severity': 'none'
-                }
-        elif volts is not None and volts < 4.5:
-             result = {
-                'stage': 'VBUS Undervoltage',
-                'fault': 'Bad Cable / Port / Fuse',
-                'action': f'{volts}V on VBUS is too low. Check USB-C cable, port, and F1 fuse.',
-                'severity': 'critical'
-            }
-        elif volts is not None and 4.0 < volts < 6.0:
-            # 5V Detected logic...
-            pass
-
-    if test_method == 'bench':
-        if volts is not None and volts > 5.0:
-            result = {
-                'stage': 'High Voltage on Bench Input',
-                'fault': 'User Error?',
-                'action': f'{volts}V detected. Bench supply should be set to ~4.2V (Battery Voltage). Did you enter a USB-C reading?',
-                'severity': 'high'
-            }
-
-    if test_method == 'battery':
-        if volts is not None and volts < 4.5:
-            result = {
-                'stage': 'VBUS Undervoltage',
-                'fault': 'Bad Cable / Port / Fuse',
-                'action': f'{volts}V on VBUS is too low. Check USB-C cable, port, and F1 fuse.',
-                'severity': 'critical'
-            }
-        elif volts is not None and volts > 12.0 and amp_val <= 0.08:
-             # Also allow 15V healthy idle for battery mode (charged battery > 15V negotiation > low current)
-             result = {
-                'stage': '15V Healthy Idle',
-                'fault': 'None (Normal)',
-                'action': f'15V Negotiated. Low draw ({amp_val}A) implies battery is full or system is idle.',
-                'severity': 'none'
-            }
-
-    if test_method == 'bypass':
-        if volts is not None and volts > 5.0:
-             # ... existing bypass logic ...
-             result = {
-                'stage': 'High Voltage on VSYS',
-                'fault': 'User Error / MOSFET Short',
-                'action': f'{volts}V detected on VSYS! Stop immediately. Bypass mode requires 4.2V injection, NOT USB-C charger.',
-                'severity': 'critical'
-            }
-    
-    if not result:
-        # Fallback to standard range lookup
-        result = {
-            'stage': 'Unknown Behavior',
-            'fault': 'Unrecognized Amp Draw',
-            'action': 'Consult advanced schematics or RetroSix Wiki',
-            'severity': 'medium',
-            'amps': amp_val,
-            'method_used': test_method
-        }
-        
-        for stage in table:
-            low, high = stage['range']
-            if low <= amp_val < high:
-                result.update(stage)
-                break
-                
-    # Add metadata
-    result['amps'] = amp_val
-    result['volts'] = volts
-    result['method_used'] = test_method
+    with SECTION_SECONDS.time('diagnose'):
+        # Parse reading (Volts and Amps)
+        volts, amp_val = parse_reading(amp_str)
+
+        # Voltage overrides + compiled range lookup, see src/diagnostics.py
+        result = diagnose(volts, amp_val, test_method)
             
     return jsonify(result)
 
-@app.route('/api/unit/<barcode>/checklist', methods=['GET', 'POST'])
+ISO_FRACTION = re.compile(r'(?<=:\d\d)\.(\d+)')
+
+def iso_seconds(value):
+    """Seconds since the epoch for an ISO 8601 stamp; 'Z' and naive stamps are UTC.
+
+    Normalises what datetime.fromisoformat only accepts from Python 3.11 on: a 'Z'
+    suffix and fractions that aren't exactly 3 or 6 digits.
+    """
+    text = str(value).strip()
+    if text[-1:] in ('Z', 'z'):
+        text = text[:-1] + '+00:00'
+    text = ISO_FRACTION.sub(lambda m: '.' + m.group(1)[:6].ljust(6, '0'), text, count=1)
+    stamp = datetime.fromisoformat(text)
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return stamp.timestamp()
+
+def sample_time(record, index, rate):
+    """Sample timestamp in seconds: numeric or ISO 8601 't'/'time'/'timestamp', else index / rate."""
+    for key in ('t', 'time', 'timestamp'):
+        value = record.get(key)
+        if value in (None, ''):
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return iso_seconds(value)
+    return index / rate
+
+def sample_reading(record):
+    """(volts, amps) from a sample: either a raw 'reading' string or separate volts/amps fields."""
+    if record.get('reading'):
+        return parse_reading(str(record['reading']))
+    volts = record.get('volts', record.get('v'))
+    amps = record.get('amps', record.get('a'))
+    volts = float(volts) if volts not in (None, '') else None
+    amps = float(amps) if amps not in (None, '') else 0.0
+    return volts, amps
+
+@app.route('/api/diagnose-boot/stream', methods=['POST'])
+def diagnose_boot_stream():
+    """Classify a whole PSU capture (CSV or NDJSON samples) in one request.
+
+    Streams back one NDJSON line per sample, then a final line with the
+    collapsed stage timeline. Pass samples=0 to only get the timeline.
+    """
+    test_method = request.args.get('test_method', 'battery')
+    fmt = request.args.get('format') or detect_format(request.mimetype)
+    rate = request.args.get('rate', 1.0, type=float) or 1.0
+    emit_samples = request.args.get('samples', '1') != '0'
+    lines = text_lines(request.stream)
+
+    def generate():
+        start = time.perf_counter()
+        timeline = StageTimeline()
+        count = errors = 0
+        for line_number, record in iter_records(lines, fmt):
+            try:
+                if record is None:
+                    raise ValueError('unreadable line')
+                t = sample_time(record, count, rate)
+                volts, amps = sample_reading(record)
+            except (TypeError, ValueError) as e:
+                errors += 1
+                if emit_samples:
+                    yield json.dumps({'line': line_number, 'error': str(e)}) + '\n'
+                continue
+
+            result = diagnose(volts, amps, test_method)
+            timeline.add(t, result)
+            count += 1
+            if emit_samples:
+                yield json.dumps({'t': t, 'volts': volts, 'amps': amps,
+                                  'stage': result['stage'], 'severity': result['severity']}) + '\n'
+
+        yield json.dumps({
+            'method_used': test_method,
+            'samples': count,
+            'errors': errors,
+            'timeline': timeline.as_list(),
+            'summary': timeline.summary()
+        }) + '\n'
+        SECTION_SECONDS.observe(time.perf_counter() - start, 'diagnose_capture')
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/units/import', methods=['POST'])
+def import_units_api():
+    """Bulk upsert units from an uploaded CSV/NDJSON file (multipart 'file') or the raw request body."""
+    upload = request.files.get('file')
+    if upload:
+        stream, fmt = upload.stream, detect_format(upload.mimetype, upload.filename)
+    else:
+        stream, fmt = request.stream, detect_format(request.mimetype)
+    fmt = request.args.get('format') or fmt
+    qwerty = request.args.get('qwerty', 'auto')
+    if qwerty not in QWERTY_MODES:
+        return jsonify({'error': f"qwerty must be one of {', '.join(QWERTY_MODES)}"}), 400
+
+    stats = import_units(get_db(), iter_records(text_lines(stream), fmt), fix_qwerty,
+                         qwerty_mode=qwerty, assign_labels=request.args.get('labels', '1') != '0')
+    change_feed.notify()
+    return jsonify(stats)
+
+@app.route('/api/units/export')
+def export_units_api():
+    fmt = 'ndjson' if request.args.get('format') == 'ndjson' else 'csv'
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    response = Response(stream_with_context(export_units(get_db(), fmt)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=units.{fmt}'
+    return response
+
+@app.cli.command('import-units')
+@click.argument('path', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--qwerty', type=click.Choice(QWERTY_MODES), default='auto', show_default=True,
+              help='Apply the QWERTY/AZERTY barcode fix.')
+@click.option('--no-labels', is_flag=True, help="Don't assign labels to unlabelled units.")
+def import_units_command(path, fmt, qwerty, no_labels):
+    """Bulk import units from a CSV or NDJSON file ('-' for stdin)."""
+    fmt = fmt or detect_format(None, path.name, default='csv')
+    stats = import_units(get_db(), iter_records(text_lines(path), fmt), fix_qwerty,
+                         qwerty_mode=qwerty, assign_labels=not no_labels)
+    print(f"{stats['rows']} rows: {stats['inserted']} inserted, {stats['updated']} updated, "
+          f"{stats['error_count']} skipped")
+    for error in stats['errors']:
+        print(f"  line {error['line']}: {error['error']}")
+
+@app.cli.command('export-units')
+@click.argument('path', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+def export_units_command(path, fmt):
+    """Export every unit as CSV or NDJSON (stdout by default)."""
+    for chunk in export_units(get_db(), fmt):
+        path.write(chunk)
+
+@app.route('/api/unit/<barcode>/checklist', methods=['GET', 'POST', 'PATCH'])
 def checklist_api(barcode):
-    """API endpoint for testing checklist state management"""
-    import json
+    """API endpoint for testing checklist state management
+
+    GET returns {item: checked} and the checklist version. PATCH takes
+    {'changes': {item: checked}} and only writes those items, POST takes the
+    full {'checklist': {...}} state and writes the items that differ.
+    Writes may carry the 'version' they were based on; a stale version gets
+    409 with the current state so the client can re-apply its changes.
+    """
     db = get_db()
-    
-    if request.method == 'GET':
-        # Retrieve checklist state
-        unit = db.execute('SELECT testing_checklist FROM units WHERE barcode = ?', (barcode,)).fetchone()
-        
-        if not unit:
-            return jsonify({'error': 'Unit not found'}), 404
-        
-        checklist = {}
-        if unit['testing_checklist']:
-            try:
-                checklist = json.loads(unit['testing_checklist'])
-            except json.JSONDecodeError:
-                checklist = {}
-        
-        return jsonify({'checklist': checklist})
-    
-    elif request.method == 'POST':
-        # Update checklist state
-        data = request.get_json()
-        checklist = data.get('checklist', {})
-        
-        # Verify unit exists
-        unit = db.execute('SELECT id FROM units WHERE barcode = ?', (barcode,)).fetchone()
-        if not unit:
+    unit = db.execute('SELECT id FROM units WHERE barcode = ?', (barcode,)).fetchone()
+    archived = None
+    if not unit:
+        archived = db.execute('SELECT * FROM units_archive WHERE barcode = ?', (barcode,)).fetchone()
+        if not archived:
             return jsonify({'error': 'Unit not found'}), 404
-        
-        # Save checklist as JSON
-        db.execute(
-            'UPDATE units SET testing_checklist = ?, updated_at = CURRENT_TIMESTAMP WHERE barcode = ?',
-            (json.dumps(checklist), barcode)
-        )
-        db.commit()
-        
-        return jsonify({'success': True, 'checklist': checklist})
+        if request.method == 'GET':
+            archived_unit, checklist, _ = load_archived(archived)
+            return jsonify({'checklist': checklist, 'version': archived_unit['checklist_version'], 'archived': True})
+        # Ticking an item on an archived unit restores it, the write goes into the same transaction
+        restore_unit(db, barcode)
+        unit = {'id': archived['id']}
+
+    if request.method == 'GET':
+        return jsonify({'checklist': load_checklist(db, unit['id']), 'version': checklist_version(db, unit['id'])})
+
+    data = request.get_json(silent=True) or {}
+    changes = data.get('changes') if request.method == 'PATCH' else data.get('checklist')
+    if not isinstance(changes, dict):
+        return jsonify({'error': 'Expected an object of {item: checked}'}), 400
+    expected = data.get('version')
+    if expected is not None and not isinstance(expected, int):
+        return jsonify({'error': 'version must be an integer'}), 400
+
+    version = bump_checklist_version(db, unit['id'], expected)
+    if version is None:
+        db.rollback()
+        if archived:
+            # The rollback undid the restore, the current state is the archived one
+            archived_unit, checklist, _ = load_archived(archived)
+            return jsonify({'error': 'Stale checklist version', 'checklist': checklist,
+                            'version': archived_unit['checklist_version']}), 409
+        return jsonify({'error': 'Stale checklist version', 'checklist': load_checklist(db, unit['id']),
+                        'version': checklist_version(db, unit['id'])}), 409
+    changed = update_checklist(db, unit['id'], changes)
+    db.commit()
+    change_feed.notify()
+
+    return jsonify({'success': True, 'changed': changed, 'version': version,
+                    'checklist': load_checklist(db, unit['id'])})
+
+@app.route('/api/unit/<barcode>/history')
+def unit_history(barcode):
+    """Field changes recorded for a unit, oldest first."""
+    db = get_db()
+    unit = db.execute('''
+        SELECT id, version FROM units WHERE barcode = :barcode
+        UNION ALL SELECT id, version FROM units_archive WHERE barcode = :barcode
+    ''', {'barcode': barcode}).fetchone()
+    if not unit:
+        return jsonify({'error': 'Unit not found'}), 404
+    events = db.execute('''
+        SELECT field, old_value, new_value, created_at FROM unit_events WHERE unit_id = ? ORDER BY id
+    ''', (unit['id'],)).fetchall()
+    return jsonify({'version': unit['version'], 'events': [dict(e) for e in events]})
+
+def sync_denied():
+    """Error response for a sync request this server won't serve, None if it will."""
+    if not SYNC_TOKEN:
+        # Off unless configured: /api/sync/apply overwrites and deletes units
+        return jsonify({'error': 'Sync is disabled on this server (SYNC_TOKEN is not set)'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {SYNC_TOKEN}'):
+        return jsonify({'error': 'Invalid sync token'}), 401
+    return None
+
+@app.route('/api/sync/changes')
+def sync_changes():
+    """Units and tombstones changed after `since` (this database's change_seq), see src/sync.py."""
+    denied = sync_denied()
+    if denied:
+        return denied
+    since = request.args.get('since', -1, type=int)
+    limit = max(1, min(request.args.get('limit', SYNC_BATCH, type=int) or SYNC_BATCH, SYNC_BATCH * 5))
+    return jsonify(collect_changes(get_db(), since, limit))
+
+@app.route('/api/sync/apply', methods=['POST'])
+def sync_apply():
+    """Merge a change set from another tracker, newer rows win."""
+    denied = sync_denied()
+    if denied:
+        return denied
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('changes', []), list) \
+            or not isinstance(payload.get('tombstones', []), list):
+        return jsonify({'error': 'Expected {"changes": [...], "tombstones": [...]}'}), 400
+    db = get_db()
+    try:
+        stats = apply_changes(db, payload)
+    except (KeyError, TypeError, ValueError,
+            sqlite3.InterfaceError, sqlite3.ProgrammingError, sqlite3.IntegrityError) as e:
+        # Wrong shapes surface as binding errors (arity, unsupported types) or constraint failures
+        db.rollback()
+        return jsonify({'error': f'Malformed change: {e}'}), 400
+    db.commit()
+    change_feed.notify()
+    return jsonify(stats)
+
+@app.route('/api/analytics')
+@cached_get(generation_validator)
+def analytics_api():
+    """Repair throughput from the precomputed summary tables (see src/analytics.py)."""
+    limit = max(1, min(request.args.get('limit', 10, type=int) or 10, SEARCH_MAX_LIMIT))
+    return jsonify(load_analytics(get_db(), limit))
 
 
 if __name__ == '__main__':
-    if not os.path.exists(DATABASE):
-        print("Initializing database...")
+    if '--dev' in sys.argv[1:]:
+        # Flask's debug server: auto-reload and tracebacks, one request at a time
         init_db()
-    app.run(host="0.0.0.0", port=5000, debug=True)
+        app.run(host="0.0.0.0", port=int(os.environ.get('PORT', 5000)), debug=True)
+    else:
+        # Production server (gunicorn, waitress on Windows), see src/wsgi.py
+        from src.wsgi import main
+        main()
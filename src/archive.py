@@ -0,0 +1,143 @@
+import json
+import zlib
+from src.analytics import CLOSED_STATUSES
+from src.checks import set_checklist_version
+from src.lookup import fix_qwerty
+
+# Archive tier for finished units.
+# Closed units that haven't changed in a while move out of units into units_archive
+# (migration 13), so the dashboard, search index and lookups only carry active work. The row,
+# its checklist and pin readings are kept as one zlib-compressed JSON blob; the columns the
+# analytics count and search shows stay plain. Archived units are found by lookup and search, and saving one restores it.
+
+ARCHIVE_BATCH = 500
+
+# Plain columns copied next to the blob (analytics dimensions, search results, validators)
+ARCHIVE_COLUMNS = ('id', 'barcode', 'label', 'model', 'type', 'patch_status', 'status', 'issue', 'owner',
+                   'version', 'updated_at')
+
+# Columns of units_archive_fts, indexed for search like units_fts
+FTS_COLUMNS = ('barcode', 'label', 'model', 'issue', 'notes', 'owner', 'condition_notes')
+
+def pack(unit, checklist, pins):
+    return zlib.compress(json.dumps({'unit': unit, 'checklist': checklist, 'pins': pins}).encode('utf-8'))
+
+def unpack(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+def archivable_ids(db, days, limit):
+    closed = ', '.join('?' * len(CLOSED_STATUSES))
+    return [row[0] for row in db.execute(f'''
+        SELECT id FROM units WHERE status IN ({closed}) AND updated_at < datetime('now', ?)
+        ORDER BY id LIMIT ?
+    ''', (*CLOSED_STATUSES, f'-{int(days)} days', limit))]
+
+def count_archivable(db, days):
+    closed = ', '.join('?' * len(CLOSED_STATUSES))
+    return db.execute(f'''
+        SELECT COUNT(*) FROM units WHERE status IN ({closed}) AND updated_at < datetime('now', ?)
+    ''', (*CLOSED_STATUSES, f'-{int(days)} days')).fetchone()[0]
+
+def archive_units(db, days, batch_size=ARCHIVE_BATCH):
+    """Move closed units not updated for `days` days to the archive, returns how many moved.
+
+    Runs in batches of `batch_size`, each its own transaction, so writers at the
+    bench only ever wait for one batch.
+    """
+    moved = 0
+    while True:
+        ids = archivable_ids(db, days, batch_size)
+        if not ids:
+            return moved
+        placeholders = ', '.join('?' * len(ids))
+        checklists = {}
+        for unit_id, item, checked, updated_at in db.execute(
+                f'SELECT unit_id, item, checked, updated_at FROM unit_checklist WHERE unit_id IN ({placeholders})', ids):
+            checklists.setdefault(unit_id, []).append([item, checked, updated_at])
+        pins = {}
+        for unit_id, pin, value in db.execute(
+                f'SELECT unit_id, pin, value FROM unit_pin_readings WHERE unit_id IN ({placeholders})', ids):
+            pins.setdefault(unit_id, []).append([pin, value])
+
+        # The checklist version rides along in the row, restore_unit() puts it back
+        for row in db.execute(f'''
+                SELECT units.*, COALESCE(v.version, 0) AS checklist_version
+                FROM units LEFT JOIN unit_checklist_versions v ON v.unit_id = units.id
+                WHERE units.id IN ({placeholders})''', ids).fetchall():
+            unit = dict(row)
+            db.execute(f'''
+                INSERT INTO units_archive ({', '.join(ARCHIVE_COLUMNS)}, data)
+                VALUES ({', '.join('?' * len(ARCHIVE_COLUMNS))}, ?)
+            ''', [unit[c] for c in ARCHIVE_COLUMNS] + [pack(unit, checklists.get(unit['id'], []), pins.get(unit['id'], []))])
+            db.execute(f'''
+                INSERT INTO units_archive_fts (rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, {', '.join('?' * len(FTS_COLUMNS))})
+            ''', [unit['id']] + [unit[c] for c in FTS_COLUMNS])
+        # The archive row exists by now, so the analytics triggers keep counting these units.
+        # Checklist, its version, pin readings and lookup keys go with the unit (ON DELETE CASCADE).
+        db.execute(f'DELETE FROM units WHERE id IN ({placeholders})', ids)
+        db.commit()
+        moved += len(ids)
+
+def find_archived(db, scanned):
+    """Archived unit for a scan: by barcode, then label, then the QWERTY-fixed barcode."""
+    fixed = fix_qwerty(scanned)
+    return db.execute('''
+        SELECT * FROM units_archive WHERE barcode IN (?, ?) OR label = ?
+        ORDER BY barcode = ? DESC, label = ? DESC LIMIT 1
+    ''', (scanned, fixed, scanned, scanned, scanned)).fetchone()
+
+def load_archived(row):
+    """An archive row as (unit dict, checklist {item: checked}, pin_check JSON)."""
+    data = unpack(row['data'])
+    unit = data['unit']
+    unit['archived_at'] = row['archived_at']
+    checklist = {item: bool(checked) for item, checked, _ in data['checklist']}
+    pin_check = json.dumps({str(pin): value for pin, value in data['pins']}) if data['pins'] else ''
+    return unit, checklist, pin_check
+
+def restore_unit(db, barcode):
+    """Move an archived unit back into units under its old id, returns the id or None.
+
+    The caller commits, so a restore and the write that needed it land together.
+    """
+    row = db.execute('SELECT id, data FROM units_archive WHERE barcode = ?', (barcode,)).fetchone()
+    if row is None:
+        return None
+    data = unpack(row['data'])
+    columns = {r[1] for r in db.execute('PRAGMA table_info(units)')}
+    unit = {k: v for k, v in data['unit'].items() if k in columns}
+    db.execute(f'INSERT INTO units ({", ".join(unit)}) VALUES ({", ".join("?" * len(unit))})', list(unit.values()))
+    db.executemany('INSERT INTO unit_checklist (unit_id, item, checked, updated_at) VALUES (?, ?, ?, ?)',
+                   [(row['id'], *item) for item in data['checklist']])
+    if data['unit'].get('checklist_version'):
+        set_checklist_version(db, row['id'], data['unit']['checklist_version'])
+    db.executemany('INSERT INTO unit_pin_readings (unit_id, pin, value) VALUES (?, ?, ?)',
+                   [(row['id'], *pin) for pin in data['pins']])
+    db.execute(f'''
+        INSERT INTO units_archive_fts (units_archive_fts, rowid, {', '.join(FTS_COLUMNS)})
+        VALUES ('delete', ?, {', '.join('?' * len(FTS_COLUMNS))})
+    ''', [row['id']] + [data['unit'].get(c) for c in FTS_COLUMNS])
+    # Deleted last: until then the insert triggers see the unit as archived and don't count it again
+    db.execute('DELETE FROM units_archive WHERE id = ?', (row['id'],))
+    return row['id']
+
+def restore_barcodes(db, barcodes):
+    """Restore whichever of `barcodes` are archived (before an import writes to them)."""
+    barcodes = list(barcodes)
+    if not barcodes:
+        return 0
+    found = [r[0] for r in db.execute(
+        f'SELECT barcode FROM units_archive WHERE barcode IN ({", ".join("?" * len(barcodes))})', barcodes)]
+    for barcode in found:
+        restore_unit(db, barcode)
+    return len(found)
+
+def compact(db):
+    """Merge the search indexes, refresh planner statistics and VACUUM the file."""
+    db.commit()
+    for table in ('units_fts', 'units_archive_fts'):
+        db.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    db.execute('ANALYZE')
+    db.commit()
+    db.execute('VACUUM')
+    db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
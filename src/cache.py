@@ -0,0 +1,86 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+# HTTP caching helpers: a data generation counter for validators, an in-process
+# response cache keyed on it, and content hashes for static asset URLs.
+
+def data_generation(db):
+    """Counter bumped by triggers on every write to units (see migration 10).
+
+    It lives in the database, so every worker process sees the same value and
+    a cached page is never served after a write, whichever process made it.
+    """
+    row = db.execute("SELECT value FROM change_counters WHERE name = 'units'").fetchone()
+    return row[0] if row else 0
+
+class ResponseCache:
+    """LRU cache of rendered responses, each stored with the data generation it was built from.
+
+    Entries from an older generation count as misses and are dropped, the TTL
+    only bounds how long unused pages stay in memory.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != generation or time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, generation, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+@lru_cache(maxsize=None)
+def _file_hash(path, mtime_ns):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+def file_hash(path):
+    """Short content hash of a file, recomputed only when its mtime changes. None if missing."""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _file_hash(path, mtime_ns)
+
+def tree_hash(*directories):
+    """Combined hash of every file under `directories`, used to salt page ETags per deploy."""
+    digest = hashlib.sha256()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, directory).encode())
+                digest.update((file_hash(path) or '').encode())
+    return digest.hexdigest()[:12]
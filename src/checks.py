@@ -0,0 +1,121 @@
+import json
+
+# Normalized testing checklist and USB-C pin readings (unit_checklist / unit_pin_readings).
+# Writes only touch the rows that changed, and pin health is computed here at write time
+# so the dashboard reads three plain columns instead of parsing JSON per row.
+
+# Pins that normally read OL (open) in diode mode
+EXPECTED_OL_PINS = {
+    # Dock: data/CC lines are normally OL, only VBUS (4, 9, 16, 21) and GND (1, 12, 13, 24) conduct
+    'Dock': {2, 3, 5, 6, 7, 8, 10, 11, 14, 15, 17, 18, 19, 20, 22, 23},
+    'Console': {2, 3, 10, 11, 14, 15, 22, 23},
+}
+
+# 23 or 24 pins OL means the port is ripped off or fully disconnected
+RIPPED_OFF_OL_COUNT = 23
+
+def parse_pin_check(value):
+    """Pin readings {pin: value} from the form's JSON, None if the value is legacy free text."""
+    if not value or not value.strip().startswith('{'):
+        return None
+    try:
+        data = json.loads(value)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    readings = {}
+    for pin, reading in data.items():
+        try:
+            pin = int(pin)
+        except (TypeError, ValueError):
+            continue
+        reading = str(reading).strip()
+        if reading:
+            readings[pin] = reading
+    return readings
+
+def pin_health(readings, unit_type):
+    """(OL count, unexpected OL pins) for a set of readings."""
+    expected = EXPECTED_OL_PINS['Dock' if unit_type == 'Dock' else 'Console']
+    ol_pins = sorted(pin for pin, value in readings.items() if value.upper() == 'OL')
+    return len(ol_pins), [pin for pin in ol_pins if pin not in expected]
+
+def load_pin_readings(db, unit_id):
+    return {row[0]: row[1] for row in db.execute(
+        'SELECT pin, value FROM unit_pin_readings WHERE unit_id = ? ORDER BY pin', (unit_id,))}
+
+def pin_check_json(db, unit_id):
+    """Readings as the JSON the unit page's pin tester expects, '' when there are none."""
+    readings = load_pin_readings(db, unit_id)
+    return json.dumps({str(pin): value for pin, value in readings.items()}) if readings else ''
+
+def save_pin_readings(db, unit_id, readings, unit_type):
+    """Store a full set of pin readings, writing only pins that changed, and refresh pin health.
+
+    An empty set ('{}' from the pin tester) still counts as checked: pin_reading_count 0.
+    """
+    db.executemany('''
+        INSERT INTO unit_pin_readings (unit_id, pin, value) VALUES (?, ?, ?)
+        ON CONFLICT(unit_id, pin) DO UPDATE SET value = excluded.value WHERE value != excluded.value
+    ''', [(unit_id, pin, value) for pin, value in readings.items()])
+
+    placeholders = ', '.join('?' * len(readings))
+    db.execute(f'DELETE FROM unit_pin_readings WHERE unit_id = ? AND pin NOT IN ({placeholders})',
+               [unit_id, *readings])
+
+    ol_count, unexpected = pin_health(readings, unit_type)
+    db.execute('''
+        UPDATE units SET pin_reading_count = ?, pin_ol_count = ?, pin_unexpected_ol = ? WHERE id = ?
+    ''', (len(readings), ol_count, ','.join(map(str, unexpected)), unit_id))
+
+def clear_pin_readings(db, unit_id):
+    db.execute('DELETE FROM unit_pin_readings WHERE unit_id = ?', (unit_id,))
+    db.execute('''
+        UPDATE units SET pin_reading_count = NULL, pin_ol_count = NULL, pin_unexpected_ol = NULL WHERE id = ?
+    ''', (unit_id,))
+
+def load_checklist(db, unit_id):
+    return {row[0]: bool(row[1]) for row in db.execute(
+        'SELECT item, checked FROM unit_checklist WHERE unit_id = ?', (unit_id,))}
+
+def update_checklist(db, unit_id, changes):
+    """Apply {item: checked} changes. Rows whose value is unchanged are not rewritten.
+
+    Returns the number of items actually changed.
+    """
+    before = db.total_changes
+    db.executemany('''
+        INSERT INTO unit_checklist (unit_id, item, checked) VALUES (?, ?, ?)
+        ON CONFLICT(unit_id, item) DO UPDATE SET checked = excluded.checked, updated_at = CURRENT_TIMESTAMP
+        WHERE checked != excluded.checked
+    ''', [(unit_id, str(item), int(bool(checked))) for item, checked in changes.items()])
+    return db.total_changes - before
+
+def checklist_version(db, unit_id):
+    row = db.execute('SELECT version FROM unit_checklist_versions WHERE unit_id = ?', (unit_id,)).fetchone()
+    return row[0] if row else 0
+
+def set_checklist_version(db, unit_id, version):
+    db.execute('''
+        INSERT INTO unit_checklist_versions (unit_id, version) VALUES (?, ?)
+        ON CONFLICT(unit_id) DO UPDATE SET version = excluded.version
+    ''', (unit_id, version))
+
+def bump_checklist_version(db, unit_id, expected=None):
+    """Take the next checklist version, None if `expected` is no longer current.
+
+    The compare-and-set runs in the same transaction as the item writes, so a
+    client working from an old version can't overwrite a newer batch. Only the
+    unit's unit_checklist_versions row is written, the unit row stays as it is.
+    """
+    row = db.execute('''
+        UPDATE unit_checklist_versions SET version = version + 1
+        WHERE unit_id = :unit_id AND (:expected IS NULL OR version = :expected) RETURNING version
+    ''', {'unit_id': unit_id, 'expected': expected}).fetchone()
+    if row is None and not expected:
+        # No row yet is version 0; a row written meanwhile makes this a no-op
+        row = db.execute('''
+            INSERT OR IGNORE INTO unit_checklist_versions (unit_id, version) VALUES (?, 1) RETURNING version
+        ''', (unit_id,)).fetchone()
+    return row[0] if row else None
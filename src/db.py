@@ -0,0 +1,144 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from src.metrics import Counter, Gauge, Histogram
+
+# Applied once per pooled connection.
+# WAL lets readers keep going while a bench station writes, NORMAL sync is safe in WAL mode
+# and busy_timeout makes concurrent writers wait for the lock instead of failing.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -16000),  # negative = KiB, ~16 MB page cache
+    ('temp_store', 'MEMORY'),
+    ('foreign_keys', 'ON'),  # child rows (checklist, pin readings) cascade with their unit
+)
+
+# sqlite3 keeps this many compiled statements per connection, so reused
+# queries skip the prepare step as long as the connection lives on
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+# Every thread's pool, so connections left behind by finished threads can be closed
+# (the threaded dev server runs each request on a new thread)
+_pools = {}
+_pools_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged with their SQL
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_MS', 100)) / 1000
+
+QUERY_SECONDS = Histogram('db_query_seconds', 'SQLite statement execution time', ('operation', 'table'))
+SLOW_QUERIES = Counter('db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS', ('operation', 'table'))
+CONNECTIONS_OPENED = Counter('db_connections_opened_total', 'SQLite connections opened')
+_open_connections = {'count': 0}
+Gauge('db_connections_open', 'SQLite connections currently open in this process',
+      callback=lambda: {(): _open_connections['count']})
+
+QUERY_TARGET_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|EXISTS|ON)\s+([A-Za-z_][A-Za-z_0-9]*)', re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def query_label(sql):
+    """(operation, table) metric labels for a statement, e.g. ('SELECT', 'units')."""
+    words = sql.split(None, 1)
+    operation = words[0].upper() if words else ''
+    match = QUERY_TARGET_RE.search(sql)
+    return operation, match.group(1) if match else ''
+
+def record_query(sql, seconds):
+    labels = query_label(sql)
+    QUERY_SECONDS.observe(seconds, *labels)
+    if seconds >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.inc(*labels)
+        logger.warning('Slow query (%.1f ms): %s', seconds * 1000, ' '.join(sql.split()))
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose execute()/executemany() calls are timed into db_query_seconds."""
+
+    closed = False
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def close(self):
+        # Closing twice (close_connections() then close_finished_threads()) must not count twice
+        super().close()
+        if not self.closed:
+            self.closed = True
+            _open_connections['count'] -= 1
+
+def connect(path, check_same_thread=True):
+    """Open a tuned connection to the database at `path`."""
+    conn = sqlite3.connect(path, timeout=5.0, cached_statements=STATEMENT_CACHE_SIZE, factory=TimedConnection,
+                           check_same_thread=check_same_thread)
+    CONNECTIONS_OPENED.inc()
+    _open_connections['count'] += 1
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+def get_connection(path):
+    """Return this thread's connection to `path`, opening it on first use.
+
+    Connections are kept per thread (sqlite3 objects must not cross threads)
+    and reused across requests instead of being reopened every time. Opening
+    one also closes those of threads that have finished since.
+    """
+    pool = getattr(_local, 'connections', None)
+    if pool is None:
+        pool = _local.connections = {}
+        with _pools_lock:
+            _pools[threading.current_thread()] = pool
+    conn = pool.get(path)
+    if conn is None:
+        close_finished_threads()
+        # Only ever used by this thread, the check is off so close_finished_threads() can close it
+        conn = pool[path] = connect(path, check_same_thread=False)
+    return conn
+
+def close_finished_threads():
+    """Close the pooled connections of threads that are no longer running."""
+    with _pools_lock:
+        finished = [thread for thread in _pools if not thread.is_alive()]
+        pools = [_pools.pop(thread) for thread in finished]
+    for pool in pools:
+        for conn in pool.values():
+            conn.close()
+        pool.clear()
+
+def release_connection(conn):
+    """Hand a connection back to the pool, dropping any uncommitted work."""
+    if conn.in_transaction:
+        conn.rollback()
+
+def close_connections():
+    """Close every connection held by the current thread."""
+    pool = getattr(_local, 'connections', None)
+    if pool is None:
+        return
+    with _pools_lock:
+        _pools.pop(threading.current_thread(), None)
+    _local.connections = None
+    for conn in pool.values():
+        conn.close()
+    pool.clear()
@@ -1,4 +1,6 @@
 import re
+from bisect import bisect_right
+from functools import lru_cache
 
 # RetroSix Wiki Based Diagnostic Tables
 DIAGNOSTIC_TABLES = {
@@ -39,54 +41,251 @@ DIAGNOSTIC_TABLES = {
     ]
 }
 
+class IntervalIndex:
+    """Sorted, non-overlapping view of one diagnostic table for O(log n) lookups.
+
+    Ranges are half-open [low, high). Where ranges overlap the stage listed
+    first wins, same as walking the table in order, so narrow ranges (e.g.
+    bench 0.130-0.145) are listed before the wide range they sit in.
+    The table is checked when compiled: bad ranges and rules that can never
+    match raise ValueError, overlaps and uncovered gaps are kept for inspection.
+    """
+
+    def __init__(self, method, stages):
+        self.method = method
+        for stage in stages:
+            low, high = stage['range']
+            if not low < high:
+                raise ValueError(f"{method}: empty range {stage['range']} for '{stage['stage']}'")
+
+        # Elementary segments between every distinct boundary, each owned by the first stage covering it
+        points = sorted({p for stage in stages for p in stage['range']})
+        self.bounds = points
+        self.segments = []
+        used = set()
+        for low, high in zip(points, points[1:]):
+            owner = None
+            for i, stage in enumerate(stages):
+                s_low, s_high = stage['range']
+                if s_low <= low and high <= s_high:
+                    owner = i
+                    break
+            if owner is not None:
+                used.add(owner)
+            self.segments.append(stages[owner] if owner is not None else None)
+
+        for i, stage in enumerate(stages):
+            if i not in used:
+                raise ValueError(f"{method}: '{stage['stage']}' is hidden by earlier ranges and can never match")
+
+        self.overlaps = []
+        for i, a in enumerate(stages):
+            for b in stages[i + 1:]:
+                if a['range'][0] < b['range'][1] and b['range'][0] < a['range'][1]:
+                    self.overlaps.append((a['stage'], b['stage']))
+
+        self.gaps = [(low, high) for (low, high), stage in zip(zip(points, points[1:]), self.segments) if stage is None]
+
+    def lookup(self, amps):
+        """Return the stage dict matching `amps`, or None if it falls in a gap."""
+        i = bisect_right(self.bounds, amps) - 1
+        if i < 0 or i >= len(self.segments):
+            return None
+        return self.segments[i]
+
+# Compiled once at import, validates every table
+COMPILED_TABLES = {method: IntervalIndex(method, stages) for method, stages in DIAGNOSTIC_TABLES.items()}
+
+def diagnose(volts, amp_val, test_method='battery'):
+    """Classify one (volts, amps) reading for a test method, returns the result dict."""
+    # Get table for method
+    index = COMPILED_TABLES.get(test_method, COMPILED_TABLES['battery'])
+
+    # Precise Voltage/Method Logic (Overrides)
+    result = None
+
+    if test_method == 'no_battery':
+        if volts is not None and volts >= 12.0:
+            # 15V Detected (Charging Enabled)
+            if amp_val <= 0.08:
+                result = {
+                    'range': (0.00, 0.08),
+                    'stage': '15V Healthy Idle',
+                    'fault': 'None (Normal)',
+                    'action': f'15V Negotiated. Low draw ({amp_val}A) is normal behavior without battery.',
+                    'severity': 'none'
+                }
+        elif volts is not None and volts < 4.5:
+             result = {
+                'stage': 'VBUS Undervoltage',
+                'fault': 'Bad Cable / Port / Fuse',
+                'action': f'{volts}V on VBUS is too low. Check USB-C cable, port, and F1 fuse.',
+                'severity': 'critical'
+            }
+        elif volts is not None and 4.0 < volts < 6.0:
+            # 5V Detected logic...
+            pass
+
+    if test_method == 'bench':
+        if volts is not None and volts > 5.0:
+            result = {
+                'stage': 'High Voltage on Bench Input',
+                'fault': 'User Error?',
+                'action': f'{volts}V detected. Bench supply should be set to ~4.2V (Battery Voltage). Did you enter a USB-C reading?',
+                'severity': 'high'
+            }
+
+    if test_method == 'battery':
+        if volts is not None and volts < 4.5:
+            result = {
+                'stage': 'VBUS Undervoltage',
+                'fault': 'Bad Cable / Port / Fuse',
+                'action': f'{volts}V on VBUS is too low. Check USB-C cable, port, and F1 fuse.',
+                'severity': 'critical'
+            }
+        elif volts is not None and volts > 12.0 and amp_val <= 0.08:
+             # Also allow 15V healthy idle for battery mode (charged battery > 15V negotiation > low current)
+             result = {
+                'stage': '15V Healthy Idle',
+                'fault': 'None (Normal)',
+                'action': f'15V Negotiated. Low draw ({amp_val}A) implies battery is full or system is idle.',
+                'severity': 'none'
+            }
+
+    if test_method == 'bypass':
+        if volts is not None and volts > 5.0:
+             # ... existing bypass logic ...
+             result = {
+                'stage': 'High Voltage on VSYS',
+                'fault': 'User Error / MOSFET Short',
+                'action': f'{volts}V detected on VSYS! Stop immediately. Bypass mode requires 4.2V injection, NOT USB-C charger.',
+                'severity': 'critical'
+            }
+
+    if not result:
+        # Fallback to standard range lookup
+        result = {
+            'stage': 'Unknown Behavior',
+            'fault': 'Unrecognized Amp Draw',
+            'action': 'Consult advanced schematics or RetroSix Wiki',
+            'severity': 'medium',
+        }
+
+        stage = index.lookup(amp_val)
+        if stage:
+            result.update(stage)
+
+    # Add metadata
+    result['amps'] = amp_val
+    result['volts'] = volts
+    result['method_used'] = test_method
+    return result
+
+def diagnose_many(readings, test_method='battery'):
+    """Classify a batch of readings for one test method.
+
+    `readings` is any iterable of raw strings ('15V/0.2A') or (volts, amps) tuples.
+    """
+    results = []
+    for reading in readings:
+        if isinstance(reading, str):
+            volts, amps = parse_reading(reading)
+        else:
+            volts, amps = reading
+        results.append(diagnose(volts, amps, test_method))
+    return results
+
+# One token = a number with an optional unit. Longest units first so 'ma' isn't read as 'm' + 'a'.
+READING_TOKEN_RE = re.compile(r'(\d*\.?\d+)\s*(µa|ua|ma|mv|a|v)?')
+
+# Divisors to base units
+AMP_UNITS = {'a': 1.0, 'ma': 1000.0, 'ua': 1000000.0, 'µa': 1000000.0}
+VOLT_UNITS = {'v': 1.0, 'mv': 1000.0}
+
+# Readings repeat a lot (typed values, PSU logs sitting at one value)
+PARSE_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_reading(s):
+    volts = None
+    amps = None
+    bare = None
+
+    # Single pass: first value with a volt unit, first with an amp unit, first without a unit
+    for match in READING_TOKEN_RE.finditer(s):
+        value, unit = match.groups()
+        if unit in AMP_UNITS:
+            if amps is None:
+                amps = float(value) / AMP_UNITS[unit]
+        elif unit in VOLT_UNITS:
+            if volts is None:
+                volts = float(value) / VOLT_UNITS[unit]
+        elif bare is None:
+            bare = float(value)
+
+    # No explicit amps: a unitless number is the current ("0.19", "15V 0.2")
+    if amps is None:
+        amps = bare if bare is not None else 0.0
+    return volts, amps
+
 def parse_reading(s):
-    """Parses strings like '15V/0.003A', '0.19A', '5V 0.4A' into (volts, amps)."""
+    """Parses strings like '15V/0.003A', '0.19A', '5V 0.4A', '15V 0.2', '200mA' into (volts, amps)."""
     if not s:
         return None, 0.0
-    
-    s = s.lower().strip()
-    volts = None
-    amps = 0.0
-    
-    # 1. Look for explicit Amps (e.g. "0.19A", "200mA")
-    amp_match = re.search(r'(\d*\.?\d+)\s*(ma|a)', s)
-    if amp_match:
-        val = float(amp_match.group(1))
-        unit = amp_match.group(2)
-        if unit == 'ma':
-            amps = val / 1000.0
-        else:
-            amps = val
-    else:
-        # 2. Fallback: Look for a number that isn't voltage
-        # If the string has 'V' but no 'A', we must be careful.
-        # "15V" -> 0 amps
-        # "15V 0.2" -> 0.2 amps
-        
-        # Regex to find all numbers
-        all_numbers = re.findall(r"[\d.]+", s)
-        
-        if 'v' in s:
-            # If there's a V, and we didn't match A, we try to find a second number
-            # Assuming format "15V 0.2"
-            if len(all_numbers) > 1:
-                # One of them is likely volts (the one near V), the other amps.
-                # But simple heuristic: the one NOT matched by volt_regex might be amps
-                pass 
-                # For now, let's just checking if there is a number that is NOT the volts
-            else:
-                 pass # voltage only
-        else:
-            # No V, no A. Just a number? "0.19" -> treat as Amps
-            try:
-                if all_numbers:
-                    amps = float(all_numbers[0])
-            except ValueError:
-                pass
-
-    # 3. Look for Volts
-    volt_match = re.search(r'(\d*\.?\d+)\s*v', s)
-    if volt_match:
-        volts = float(volt_match.group(1))
-        
-    return volts, amps
+    return _parse_reading(s.lower().strip())
+
+def parse_many(readings):
+    """Parse an iterable of reading strings, returns a list of (volts, amps)."""
+    return [parse_reading(s) for s in readings]
+
+# Final stage of a capture longer than this is reported as "stuck"
+STUCK_SECONDS = 2.0
+
+class StageTimeline:
+    """Collapses a stream of classified samples into consecutive stage segments."""
+
+    def __init__(self):
+        self.segments = []
+
+    def add(self, t, result):
+        last = self.segments[-1] if self.segments else None
+        if last and last['stage'] == result['stage']:
+            last['end'] = t
+            last['samples'] += 1
+            last['min_amps'] = min(last['min_amps'], result['amps'])
+            last['max_amps'] = max(last['max_amps'], result['amps'])
+            last['_amp_total'] += result['amps']
+            return
+        if last:
+            # A segment lasts until the next one starts
+            last['end'] = t
+        self.segments.append({
+            'stage': result['stage'],
+            'severity': result['severity'],
+            'start': t,
+            'end': t,
+            'samples': 1,
+            'min_amps': result['amps'],
+            'max_amps': result['amps'],
+            '_amp_total': result['amps'],
+        })
+
+    def as_list(self):
+        timeline = []
+        for seg in self.segments:
+            seg = dict(seg)
+            seg['avg_amps'] = round(seg.pop('_amp_total') / seg['samples'], 4)
+            seg['duration'] = round(seg['end'] - seg['start'], 3)
+            timeline.append(seg)
+        return timeline
+
+    def summary(self):
+        """One-line description, e.g. 'VSYS Idle (OK) → 1st Stage Boot OK → stuck at 0.2A for 4s'."""
+        timeline = self.as_list()
+        if not timeline:
+            return 'No samples'
+        text = ' → '.join(seg['stage'] for seg in timeline)
+        last = timeline[-1]
+        if last['duration'] >= STUCK_SECONDS:
+            text += f" → stuck at {last['avg_amps']:g}A for {last['duration']:g}s"
+        return text
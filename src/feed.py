@@ -0,0 +1,88 @@
+import queue
+import threading
+from src.db import get_connection
+from src.cache import data_generation
+
+# Live change feed for the dashboard (Server-Sent Events, see /api/events).
+# Every write to units stamps the row with the next change_seq (migration 11),
+# so "what changed" is one indexed range query, whichever process wrote it.
+
+POLL_INTERVAL = 0.5
+MAX_BATCH = 200
+SUBSCRIBER_QUEUE_SIZE = 64
+
+# Put on a subscriber's queue when it fell too far behind, the client reloads instead
+RESYNC = None
+
+def changes_since(db, seq, columns, limit=MAX_BATCH):
+    """Units changed after `seq`, oldest change first."""
+    return db.execute(f'''
+        SELECT change_seq, {columns} FROM units WHERE change_seq > ? ORDER BY change_seq LIMIT ?
+    ''', (seq, limit)).fetchall()
+
+class ChangeFeed:
+    """Fans unit changes out to the SSE connections of this process.
+
+    A single watcher thread polls the change counter (one primary-key lookup
+    per POLL_INTERVAL however many screens are open) and only reads rows when
+    it moved. The thread stops with the last subscriber, so a server without
+    open dashboards does no work at all.
+    """
+
+    def __init__(self, path, columns, interval=POLL_INTERVAL):
+        self.path = path
+        self.columns = columns
+        self.interval = interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def notify(self):
+        """Poll right away instead of at the next tick (called after local writes)."""
+        self._wake.set()
+
+    def _publish(self, rows):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(rows)
+            except queue.Full:
+                # A stalled client: drop what it missed and have it reload the page
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(RESYNC)
+
+    def _run(self):
+        db = get_connection(self.path)
+        last = data_generation(db)
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            generation = data_generation(db)
+            while generation != last:
+                rows = changes_since(db, last, self.columns)
+                if not rows:
+                    # Deletes move the counter without leaving a changed row behind
+                    last = generation
+                    break
+                last = rows[-1]['change_seq']
+                self._publish(rows)
+            self._wake.wait(self.interval)
+            self._wake.clear()
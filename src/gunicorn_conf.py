@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+# Production server settings: gunicorn -c python:src.gunicorn_conf src.wsgi:app
+# Every value can be overridden from the environment, no file edits needed per deploy.
+#
+# Each worker process runs THREADS request threads with their own pooled SQLite
+# connection (src/db.py). WAL lets all of them read concurrently, and writers
+# queue on busy_timeout instead of failing, so several processes are safe.
+# Dashboard feeds (/api/events) hold a thread each while a screen is open, so every
+# worker gets STREAM_THREADS more threads for them; src/app.py caps open feeds at that
+# and answers the rest like a poll, which keeps the THREADS for page requests free.
+# SIGHUP reloads gracefully: new workers start, old ones finish their requests.
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 8)) + int(os.environ.get('STREAM_THREADS', 32))
+timeout = int(os.environ.get('TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Recycle workers now and then so a slow leak can't grow forever (0 disables)
+max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-' if os.environ.get('ACCESS_LOG', '1') != '0' else None
+errorlog = '-'
+
+def migrate():
+    # In a child process: importing the app here would put it in the master, and workers
+    # forked from it would keep running the old code after a reload
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'src.app', 'migrate'], check=True)
+
+def on_starting(server):
+    """Apply migrations once, before any worker opens the database."""
+    migrate()
+
+def on_reload(server):
+    migrate()
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+from src.labels import allocate_label, observe_label
+from src.checks import parse_pin_check, save_pin_readings
+from src.ssnc import check_serial
+from src.archive import restore_barcodes, unpack
+
+# Bulk intake: stream records in, upsert them chunk by chunk; stream units out.
+
+# Columns a file may set. Empty values never overwrite what is already stored.
+IMPORT_FIELDS = ('model', 'issue', 'status', 'notes', 'label', 'type', 'patch_status', 'pin_check',
+                 'usb_c_reading', 'amp_draw', 'condition_notes', 'owner', 'modchip')
+
+EXPORT_COLUMNS = ('barcode', 'label', 'type', 'model', 'patch_status', 'status', 'issue', 'owner',
+                  'condition_notes', 'modchip', 'pin_check', 'usb_c_reading', 'amp_draw', 'notes',
+                  'created_at', 'updated_at')
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+# Label prefixes used by the AUTO button on the unit page
+LABEL_PREFIXES = {'Console': 'SW', 'Dock': 'DK'}
+
+QWERTY_MODES = ('auto', 'always', 'never')
+
+def is_known_serial(info):
+    return info['model'] != 'Unknown' and not info['patch_status'].startswith('Unknown')
+
+def normalize_barcode(raw, qwerty_fix, mode):
+    """Apply the QWERTY/AZERTY fix according to `mode`.
+
+    'auto' only keeps the fixed barcode when it is a recognised serial and the raw one is not,
+    so files that were typed on the right layout pass through untouched.
+    """
+    barcode = raw.strip()
+    if mode == 'never' or not barcode:
+        return barcode
+    fixed = qwerty_fix(barcode)
+    if mode == 'always' or fixed == barcode:
+        return fixed
+    if not is_known_serial(check_serial(barcode)) and is_known_serial(check_serial(fixed)):
+        return fixed
+    return barcode
+
+def prepare_row(record, qwerty_fix, qwerty_mode):
+    """Normalize one import record into a column dict, classifying the serial when needed."""
+    barcode = normalize_barcode(str(record.get('barcode') or record.get('serial') or ''), qwerty_fix, qwerty_mode)
+    if not barcode:
+        raise ValueError('missing barcode')
+    row = {'barcode': barcode}
+    for field in IMPORT_FIELDS:
+        value = record.get(field)
+        value = str(value).strip() if value is not None else ''
+        row[field] = value or None
+
+    if row['type'] in (None, 'Console'):
+        info = check_serial(barcode)
+        if info['type'] in ('Console', 'Dock') and row['type'] in (None, info['type']):
+            row['type'] = row['type'] or info['type']
+            row['model'] = row['model'] or info['model']
+            row['patch_status'] = row['patch_status'] or info['patch_status']
+    return row
+
+UPSERT_SQL = '''
+    INSERT INTO units (barcode, {cols}) VALUES (?, {marks})
+    ON CONFLICT(barcode) DO UPDATE SET {updates}, version = version + 1, updated_at = CURRENT_TIMESTAMP
+'''.format(
+    cols=', '.join(IMPORT_FIELDS),
+    marks=', '.join('?' * len(IMPORT_FIELDS)),
+    updates=', '.join(f'{f} = COALESCE(excluded.{f}, {f})' for f in IMPORT_FIELDS),
+)
+
+def write_chunk(db, rows, assign_labels, stats):
+    """Upsert one chunk in a single transaction."""
+    barcodes = list({row['barcode'] for row in rows})
+    placeholders = ', '.join('?' * len(barcodes))
+    # Re-imported units that were archived are updated in place, not duplicated
+    restore_barcodes(db, barcodes)
+    existing = {r[0]: r[1] for r in db.execute(
+        f'SELECT barcode, label FROM units WHERE barcode IN ({placeholders})', barcodes)}
+
+    seen = set()
+    for row in rows:
+        if row['barcode'] in existing or row['barcode'] in seen:
+            stats['updated'] += 1
+        else:
+            stats['inserted'] += 1
+            # Same default as the column, which an explicit NULL would bypass
+            row['status'] = row['status'] or 'Received'
+        seen.add(row['barcode'])
+
+        if row['label']:
+            observe_label(db, row['label'])
+        elif assign_labels and not existing.get(row['barcode']):
+            # Only label units that don't have one yet, and only once per barcode
+            row['label'] = allocate_label(db, LABEL_PREFIXES.get(row['type'], 'SW'))
+            existing[row['barcode']] = row['label']
+
+    # Pin tester JSON goes to unit_pin_readings like a form save
+    pins = {}
+    for row in rows:
+        readings = parse_pin_check(row['pin_check'])
+        if readings is not None:
+            pins[row['barcode']] = (readings, row['type'])
+            row['pin_check'] = None
+
+    db.executemany(UPSERT_SQL, [[row['barcode']] + [row[f] for f in IMPORT_FIELDS] for row in rows])
+    for barcode, (readings, unit_type) in pins.items():
+        unit_id, stored_type = db.execute('SELECT id, type FROM units WHERE barcode = ?', (barcode,)).fetchone()
+        save_pin_readings(db, unit_id, readings, unit_type or stored_type)
+    db.commit()
+
+def import_units(db, records, qwerty_fix, qwerty_mode='auto', assign_labels=True, chunk_size=CHUNK_SIZE):
+    """Upsert units from an iterable of (line_number, record) pairs (see src/records.py).
+
+    Rows are written in chunked transactions, so memory stays flat whatever the file size.
+    Returns counts and the first few row errors.
+    """
+    stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'errors': []}
+    error_count = 0
+    chunk = []
+    for line_number, record in records:
+        try:
+            if record is None:
+                raise ValueError('unreadable line')
+            chunk.append(prepare_row(record, qwerty_fix, qwerty_mode))
+        except ValueError as e:
+            error_count += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append({'line': line_number, 'error': str(e)})
+            continue
+        stats['rows'] += 1
+        if len(chunk) >= chunk_size:
+            write_chunk(db, chunk, assign_labels, stats)
+            chunk = []
+    if chunk:
+        write_chunk(db, chunk, assign_labels, stats)
+    stats['error_count'] = error_count
+    return stats
+
+# Pin readings are exported in the same JSON form the unit page and import use. Units never
+# pin tested keep an empty cell, pin_reading_count is only set once readings were saved
+# (0 for an empty '{}', which json_group_object() of no rows gives back)
+EXPORT_EXPRESSIONS = {
+    'pin_check': '''COALESCE(u.pin_check, CASE WHEN u.pin_reading_count IS NOT NULL THEN
+        (SELECT json_group_object(pin, value) FROM unit_pin_readings WHERE unit_id = u.id) END)''',
+}
+
+def export_rows(db):
+    """EXPORT_COLUMNS tuples for every unit, the active ones then the archive, row by row."""
+    columns = ', '.join(EXPORT_EXPRESSIONS.get(c, f'u.{c}') for c in EXPORT_COLUMNS)
+    yield from db.execute(f'SELECT {columns} FROM units u ORDER BY u.id')
+    for (data,) in db.execute('SELECT data FROM units_archive ORDER BY id'):
+        data = unpack(data)
+        unit = data['unit']
+        if unit.get('pin_reading_count') is not None and not unit.get('pin_check'):
+            unit['pin_check'] = json.dumps({str(pin): value for pin, value in data['pins']}, separators=(',', ':'))
+        yield tuple(unit.get(c) for c in EXPORT_COLUMNS)
+
+def export_units(db, fmt='csv'):
+    """Yield every unit as CSV or NDJSON lines, reading the tables row by row."""
+    cursor = export_rows(db)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in cursor:
+            writer.writerow(['' if v is None else v for v in row])
+            # Flush every row so the buffer never grows
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+
+    for row in cursor:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n'
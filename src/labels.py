@@ -0,0 +1,38 @@
+import re
+
+# Board labels are a letter prefix followed by a number, e.g. SW023, DK005
+LABEL_RE = re.compile(r'^([A-Z]+)(\d+)$')
+
+def split_label(label):
+    """Split 'SW023' into ('SW', 23), returns None for free-form labels."""
+    if not label:
+        return None
+    match = LABEL_RE.match(label.strip().upper())
+    if not match:
+        return None
+    return match.group(1), int(match.group(2))
+
+def format_label(prefix, number):
+    return f"{prefix}{number:03d}"
+
+def allocate_label(db, prefix):
+    """Atomically take the next number for `prefix` from label_sequences.
+
+    A single upsert increments the counter, so two stations asking at the
+    same moment get different labels. The caller commits.
+    """
+    row = db.execute('''
+        INSERT INTO label_sequences (prefix, last_value) VALUES (?, 1)
+        ON CONFLICT(prefix) DO UPDATE SET last_value = last_value + 1
+        RETURNING last_value
+    ''', (prefix,)).fetchone()
+    return format_label(prefix, row[0])
+
+def observe_label(db, label):
+    """Push the counter past a label that was typed in by hand."""
+    parts = split_label(label)
+    if parts:
+        db.execute('''
+            INSERT INTO label_sequences (prefix, last_value) VALUES (?, ?)
+            ON CONFLICT(prefix) DO UPDATE SET last_value = MAX(last_value, excluded.last_value)
+        ''', parts)
@@ -0,0 +1,37 @@
+# Scanner input -> unit in one indexed query.
+# unit_lookup holds every unit's barcode and label, kept in step with units by plain SQL
+# triggers (migration 12). A barcode scanned on the wrong keyboard layout is fixed
+# here before the query, so the tables never depend on Python code.
+
+QWERTY_MAP = {
+    'A': 'Q', 'Q': 'A', 'Z': 'W', 'W': 'Z',
+    'a': 'q', 'q': 'a', 'z': 'w', 'w': 'z',
+    'm': ',', ',': 'm', 'M': '?', '?': 'M',
+    '&': '1', 'é': '2', '"': '3', "'": '4', '(': '5',
+    '-': '6', 'è': '7', '_': '8', 'ç': '9', 'à': '0',
+    ')': '-', '=': '='
+}
+QWERTY_TABLE = str.maketrans(QWERTY_MAP)
+
+# unit_lookup.kind, also the order matches are preferred in.
+# LOOKUP_VARIANT is never stored: it marks a match on the layout-fixed barcode.
+LOOKUP_BARCODE = 0
+LOOKUP_LABEL = 1
+LOOKUP_VARIANT = 2
+
+def fix_qwerty(barcode):
+    """Convert QWERTY-scanned barcode to AZERTY equivalent"""
+    return barcode.translate(QWERTY_TABLE)
+
+def resolve_unit(db, scanned):
+    """The unit a scan refers to, by barcode, label or wrong-layout barcode, None if unknown.
+
+    The row is the unit's with an extra `kind` column telling which of them matched.
+    """
+    return db.execute('''
+        SELECT CASE WHEN l.key = :scanned THEN l.kind ELSE :variant END AS kind, u.*
+        FROM unit_lookup l JOIN units u ON u.id = l.unit_id
+        WHERE l.key IN (:scanned, :fixed) AND (l.key = :scanned OR l.kind = :barcode)
+        ORDER BY 1, l.unit_id LIMIT 1
+    ''', {'scanned': scanned, 'fixed': fix_qwerty(scanned), 'barcode': LOOKUP_BARCODE,
+          'variant': LOOKUP_VARIANT}).fetchone()
@@ -0,0 +1,555 @@
+import json
+import sqlite3
+from src.labels import split_label
+from src.checks import parse_pin_check, pin_health
+
+# Ordered schema upgrade steps. Each one runs in its own transaction and is
+# recorded in schema_migrations, so old databases are brought up to date step
+# by step and fresh ones are built the same way.
+# Never edit a released step, append a new one instead. Steps write their own
+# SQL: the app's write functions follow the latest schema, which a step
+# upgrading an old database doesn't have yet. Parsing helpers are fine.
+MIGRATIONS = []
+
+def migration(version, name):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+def execute_script(db, sql):
+    """Run a multi-statement script inside the current transaction.
+
+    sqlite3's executescript() commits first, which would break the per-step
+    transaction, so statements (including trigger bodies) are split here.
+    """
+    statement = ''
+    for line in sql.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            db.execute(statement)
+            statement = ''
+    if statement.strip():
+        db.execute(statement)
+
+def table_columns(db, table):
+    return {row[1] for row in db.execute(f'PRAGMA table_info({table})')}
+
+@migration(1, 'create units')
+def create_units(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS units (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            barcode TEXT UNIQUE NOT NULL,
+            model TEXT,
+            issue TEXT,
+            status TEXT DEFAULT 'Received',
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+@migration(2, 'unit repair fields')
+def add_unit_fields(db):
+    # Older databases got some of these by hand, only add what is missing
+    fields = ('label', 'type', 'patch_status', 'pin_check', 'usb_c_reading', 'amp_draw',
+              'condition_notes', 'owner', 'modchip', 'testing_checklist')
+    existing = table_columns(db, 'units')
+    for field in fields:
+        if field not in existing:
+            db.execute(f'ALTER TABLE units ADD COLUMN {field} TEXT')
+
+# Full-text search index over units (trigram, so partial serials and labels match).
+# External content table: rows live in units, the index only stores tokens.
+# rebuild-search runs it again on databases that predate it.
+SEARCH_INDEX = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS units_fts USING fts5(
+        barcode, label, model, issue, notes, owner, condition_notes,
+        content='units', content_rowid='id', tokenize='trigram'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS units_fts_ai AFTER INSERT ON units BEGIN
+        INSERT INTO units_fts(rowid, barcode, label, model, issue, notes, owner, condition_notes)
+        VALUES (new.id, new.barcode, new.label, new.model, new.issue, new.notes, new.owner, new.condition_notes);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS units_fts_ad AFTER DELETE ON units BEGIN
+        INSERT INTO units_fts(units_fts, rowid, barcode, label, model, issue, notes, owner, condition_notes)
+        VALUES ('delete', old.id, old.barcode, old.label, old.model, old.issue, old.notes, old.owner, old.condition_notes);
+    END;
+
+    -- Only re-index when a searchable column changes (checklist saves don't touch the index)
+    CREATE TRIGGER IF NOT EXISTS units_fts_au AFTER UPDATE OF barcode, label, model, issue, notes, owner, condition_notes ON units BEGIN
+        INSERT INTO units_fts(units_fts, rowid, barcode, label, model, issue, notes, owner, condition_notes)
+        VALUES ('delete', old.id, old.barcode, old.label, old.model, old.issue, old.notes, old.owner, old.condition_notes);
+        INSERT INTO units_fts(rowid, barcode, label, model, issue, notes, owner, condition_notes)
+        VALUES (new.id, new.barcode, new.label, new.model, new.issue, new.notes, new.owner, new.condition_notes);
+    END;
+'''
+
+@migration(3, 'full-text search index')
+def create_search_index(db):
+    execute_script(db, SEARCH_INDEX)
+    db.execute("INSERT INTO units_fts(units_fts) VALUES ('rebuild')")
+
+@migration(4, 'dashboard and lookup indexes')
+def create_unit_indexes(db):
+    # Label redirects in unit_detail() (WHERE label = ?)
+    db.execute('CREATE INDEX IF NOT EXISTS idx_units_label ON units(label)')
+    # Dashboard ORDER BY updated_at DESC, id DESC and its keyset cursor
+    db.execute('CREATE INDEX IF NOT EXISTS idx_units_updated ON units(updated_at, id)')
+    # Status filter and in-progress count
+    db.execute('CREATE INDEX IF NOT EXISTS idx_units_status ON units(status)')
+
+@migration(5, 'label sequences')
+def create_label_sequences(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS label_sequences (
+            prefix TEXT PRIMARY KEY,
+            last_value INTEGER NOT NULL
+        )
+    ''')
+    # Backfill each counter from the highest label already handed out
+    parts = [split_label(label) for (label,) in db.execute('SELECT label FROM units WHERE label IS NOT NULL')]
+    db.executemany('''
+        INSERT INTO label_sequences (prefix, last_value) VALUES (?, ?)
+        ON CONFLICT(prefix) DO UPDATE SET last_value = MAX(last_value, excluded.last_value)
+    ''', [p for p in parts if p])
+
+@migration(6, 'normalized checklist and pin readings')
+def create_check_tables(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS unit_checklist (
+            unit_id INTEGER NOT NULL REFERENCES units(id) ON DELETE CASCADE,
+            item TEXT NOT NULL,
+            checked INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (unit_id, item)
+        ) WITHOUT ROWID
+    ''')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS unit_pin_readings (
+            unit_id INTEGER NOT NULL REFERENCES units(id) ON DELETE CASCADE,
+            pin INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (unit_id, pin)
+        ) WITHOUT ROWID
+    ''')
+    # Pin health precomputed at write time for the dashboard
+    existing = table_columns(db, 'units')
+    for field, decl in (('pin_reading_count', 'INTEGER'), ('pin_ol_count', 'INTEGER'), ('pin_unexpected_ol', 'TEXT')):
+        if field not in existing:
+            db.execute(f'ALTER TABLE units ADD COLUMN {field} {decl}')
+
+    # Move the JSON blobs into the child tables
+    rows = db.execute('''
+        SELECT id, type, testing_checklist, pin_check FROM units
+        WHERE testing_checklist IS NOT NULL OR pin_check LIKE '{%'
+    ''').fetchall()
+    for unit_id, unit_type, checklist, pin_check in rows:
+        if checklist:
+            try:
+                state = json.loads(checklist)
+            except json.JSONDecodeError:
+                state = None
+            if isinstance(state, dict):
+                db.executemany('''
+                    INSERT INTO unit_checklist (unit_id, item, checked) VALUES (?, ?, ?)
+                    ON CONFLICT(unit_id, item) DO UPDATE SET checked = excluded.checked
+                ''', [(unit_id, str(item), int(bool(checked))) for item, checked in state.items()])
+        readings = parse_pin_check(pin_check)
+        if readings is None:
+            continue
+        # An empty object still marks the unit as checked (pin_reading_count 0)
+        db.executemany('INSERT OR REPLACE INTO unit_pin_readings (unit_id, pin, value) VALUES (?, ?, ?)',
+                       [(unit_id, pin, value) for pin, value in readings.items()])
+        ol_count, unexpected = pin_health(readings, unit_type)
+        db.execute('''
+            UPDATE units SET pin_check = NULL, pin_reading_count = ?, pin_ol_count = ?, pin_unexpected_ol = ?
+            WHERE id = ?
+        ''', (len(readings), ol_count, ','.join(map(str, unexpected)), unit_id))
+    db.execute('UPDATE units SET testing_checklist = NULL WHERE testing_checklist IS NOT NULL')
+
+@migration(7, 'checklist version')
+def create_checklist_versions(db):
+    # Kept out of units so a checklist toggle writes child rows only, never the unit row.
+    # No row means version 0.
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS unit_checklist_versions (
+            unit_id INTEGER PRIMARY KEY REFERENCES units(id) ON DELETE CASCADE,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+# Unit fields whose changes are recorded in unit_events
+TRACKED_FIELDS = ('status', 'model', 'issue', 'notes', 'label', 'type', 'patch_status', 'usb_c_reading',
+                  'amp_draw', 'condition_notes', 'owner', 'modchip')
+
+@migration(8, 'row versions and unit events')
+def create_unit_events(db):
+    if 'version' not in table_columns(db, 'units'):
+        db.execute('ALTER TABLE units ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+    # Append-only change log, written by triggers so every writer (form, import, ...) is covered
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS unit_events (
+            id INTEGER PRIMARY KEY,
+            unit_id INTEGER NOT NULL,
+            field TEXT NOT NULL,
+            old_value TEXT,
+            new_value TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_unit_events_unit ON unit_events(unit_id, id)')
+
+    changes = ' UNION ALL '.join(
+        f"SELECT '{field}' AS field, old.{field} AS old_value, new.{field} AS new_value" for field in TRACKED_FIELDS)
+    execute_script(db, f'''
+        CREATE TRIGGER IF NOT EXISTS units_events_ai AFTER INSERT ON units BEGIN
+            INSERT INTO unit_events (unit_id, field, old_value, new_value) VALUES (new.id, 'status', NULL, new.status);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS units_events_au AFTER UPDATE OF {', '.join(TRACKED_FIELDS)} ON units BEGIN
+            INSERT INTO unit_events (unit_id, field, old_value, new_value)
+            SELECT new.id, field, old_value, new_value FROM ({changes}) WHERE old_value IS NOT new_value;
+        END;
+    ''')
+
+    # Starting point for existing units: their current status since their last update
+    db.execute('''
+        INSERT INTO unit_events (unit_id, field, old_value, new_value, created_at)
+        SELECT id, 'status', NULL, status, COALESCE(updated_at, created_at) FROM units
+    ''')
+
+# Analytics summary tables, read by src/analytics.py. Trigger bodies bake in the closed
+# statuses: steps pass the ones they shipped with, rebuild-analytics the current ones.
+STAT_DIMENSIONS = ('status', 'model', 'type', 'patch_status', 'owner', 'issue')
+
+ANALYTICS_TABLES = '''
+    CREATE TABLE IF NOT EXISTS unit_stats (
+        dimension TEXT NOT NULL,
+        key TEXT NOT NULL,
+        units INTEGER NOT NULL DEFAULT 0,
+        closed INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, key)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS status_time (
+        status TEXT PRIMARY KEY,
+        seconds REAL NOT NULL DEFAULT 0,
+        stays INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS closed_daily (
+        day TEXT PRIMARY KEY,
+        closed INTEGER NOT NULL DEFAULT 0
+    );
+'''
+
+ANALYTICS_TRIGGERS = ('units_stats_ai', 'units_stats_ad', 'units_stats_au', 'unit_events_stats_ai')
+
+def sql_list(values):
+    return ', '.join("'" + value.replace("'", "''") + "'" for value in values)
+
+def stats_rows(ref, sign, closed, source=''):
+    """One (dimension, key, units, closed) row per dimension for the unit `ref`."""
+    is_closed = f"{sign} * (COALESCE({ref}.status, '') IN ({sql_list(closed)}))"
+    rows = [f"SELECT 'all' AS dimension, '' AS key, {sign} AS units, {is_closed} AS closed{source}"]
+    rows += [f"SELECT '{d}', COALESCE({ref}.{d}, ''), {sign}, {is_closed}{source}" for d in STAT_DIMENSIONS]
+    return ' UNION ALL '.join(rows)
+
+def stats_upsert(rows):
+    return f'''
+        INSERT INTO unit_stats (dimension, key, units, closed)
+        SELECT dimension, key, SUM(units), SUM(closed) FROM ({rows}) GROUP BY dimension, key
+        HAVING SUM(units) != 0 OR SUM(closed) != 0
+        ON CONFLICT(dimension, key) DO UPDATE SET units = units + excluded.units, closed = closed + excluded.closed;
+    '''
+
+def analytics_triggers(closed, archive=False):
+    """Script creating the triggers that keep the summary tables in step with units and unit_events.
+
+    With `archive`, moving a unit to or from units_archive (src/archive.py) is not an
+    insert or delete as far as the stats go: archived units keep counting.
+    """
+    def unarchived(ref):
+        return f'WHEN NOT EXISTS (SELECT 1 FROM units_archive WHERE id = {ref}.id) ' if archive else ''
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS units_stats_ai AFTER INSERT ON units {unarchived('new')}BEGIN
+            {stats_upsert(stats_rows('new', 1, closed))}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS units_stats_ad AFTER DELETE ON units {unarchived('old')}BEGIN
+            {stats_upsert(stats_rows('old', -1, closed))}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS units_stats_au AFTER UPDATE OF {', '.join(STAT_DIMENSIONS)} ON units BEGIN
+            {stats_upsert(stats_rows('old', -1, closed) + ' UNION ALL ' + stats_rows('new', 1, closed))}
+        END;
+
+        -- A status event closes the stay in the previous status, which started at that status's own event
+        CREATE TRIGGER IF NOT EXISTS unit_events_stats_ai AFTER INSERT ON unit_events WHEN new.field = 'status' BEGIN
+            INSERT INTO status_time (status, seconds, stays)
+            SELECT new.old_value, (julianday(new.created_at) - julianday(prev.created_at)) * 86400, 1
+            FROM (SELECT created_at FROM unit_events WHERE unit_id = new.unit_id AND field = 'status' AND id < new.id
+                  ORDER BY id DESC LIMIT 1) AS prev
+            WHERE new.old_value IS NOT NULL
+            ON CONFLICT(status) DO UPDATE SET seconds = seconds + excluded.seconds, stays = stays + 1;
+
+            INSERT INTO closed_daily (day, closed)
+            SELECT date(new.created_at), 1
+            WHERE new.new_value IN ({sql_list(closed)}) AND COALESCE(new.old_value, '') NOT IN ({sql_list(closed)})
+            ON CONFLICT(day) DO UPDATE SET closed = closed + 1;
+        END;
+    '''
+
+def recompute_analytics(db, closed, archive=False):
+    """Count every unit (archived ones too, with `archive`) and status event into the summary tables."""
+    db.execute('DELETE FROM unit_stats')
+    db.execute('DELETE FROM status_time')
+    db.execute('DELETE FROM closed_daily')
+    rows = stats_rows('u', 1, closed, ' FROM units u')
+    if archive:
+        rows += ' UNION ALL ' + stats_rows('a', 1, closed, ' FROM units_archive a')
+    db.execute(f'''
+        INSERT INTO unit_stats (dimension, key, units, closed)
+        SELECT dimension, key, SUM(units), SUM(closed) FROM ({rows})
+        GROUP BY dimension, key
+    ''')
+    db.execute('''
+        INSERT INTO status_time (status, seconds, stays)
+        SELECT old_value, SUM((julianday(created_at) - julianday(prev)) * 86400), COUNT(*) FROM (
+            SELECT old_value, created_at,
+                   LAG(created_at) OVER (PARTITION BY unit_id ORDER BY id) AS prev
+            FROM unit_events WHERE field = 'status'
+        ) WHERE old_value IS NOT NULL AND prev IS NOT NULL
+        GROUP BY old_value
+    ''')
+    db.execute(f'''
+        INSERT INTO closed_daily (day, closed)
+        SELECT date(created_at), COUNT(*) FROM unit_events
+        WHERE field = 'status' AND new_value IN ({sql_list(closed)}) AND COALESCE(old_value, '') NOT IN ({sql_list(closed)})
+        GROUP BY date(created_at)
+    ''')
+
+@migration(9, 'analytics summary tables')
+def create_analytics_tables(db):
+    # CLOSED_STATUSES (src/analytics.py) when this step shipped
+    closed = ('Done', 'Delivered', 'Cancelled')
+    execute_script(db, ANALYTICS_TABLES + analytics_triggers(closed))
+    # Triggers keep them current from here on, existing units and events are counted once now
+    recompute_analytics(db, closed)
+
+
+@migration(10, 'change counters')
+def create_change_counters(db):
+    # Bumped on every unit write, HTTP caching uses it as the data generation (src/cache.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS change_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    db.execute("INSERT OR IGNORE INTO change_counters (name, value) VALUES ('units', 0)")
+    for event, suffix in (('INSERT', 'ai'), ('UPDATE', 'au'), ('DELETE', 'ad')):
+        db.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS units_counter_{suffix} AFTER {event} ON units BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'units';
+            END
+        ''')
+
+
+@migration(11, 'unit change sequence')
+def add_change_seq(db):
+    # Each write stamps its row with the next value of the 'units' counter, so changed rows
+    # are found with one range query on change_seq (live dashboard feed, src/feed.py).
+    # Existing rows keep 0: they predate every client.
+    if 'change_seq' not in table_columns(db, 'units'):
+        db.execute('ALTER TABLE units ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_units_change_seq ON units(change_seq)')
+
+    db.execute('DROP TRIGGER IF EXISTS units_counter_ai')
+    db.execute('DROP TRIGGER IF EXISTS units_counter_au')
+    stamp = '''
+        UPDATE change_counters SET value = value + 1 WHERE name = 'units';
+        UPDATE units SET change_seq = (SELECT value FROM change_counters WHERE name = 'units') WHERE id = new.id;
+    '''
+    execute_script(db, f'''
+        CREATE TRIGGER IF NOT EXISTS units_changes_ai AFTER INSERT ON units BEGIN
+            {stamp}
+        END;
+
+        -- The stamp itself is an update, the WHEN stops it from firing again
+        CREATE TRIGGER IF NOT EXISTS units_changes_au AFTER UPDATE ON units WHEN new.change_seq IS old.change_seq BEGIN
+            {stamp}
+        END;
+    ''')
+
+
+@migration(12, 'unit lookup index')
+def create_unit_lookup(db):
+    # Barcodes and labels in one table, so a scan resolves in one query (src/lookup.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS unit_lookup (
+            key TEXT NOT NULL,
+            kind INTEGER NOT NULL,
+            unit_id INTEGER NOT NULL REFERENCES units(id) ON DELETE CASCADE,
+            PRIMARY KEY (key, kind, unit_id)
+        ) WITHOUT ROWID
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_unit_lookup_unit ON unit_lookup(unit_id)')
+    # kind 0 = barcode, 1 = label. Deleted units take their rows with them (ON DELETE CASCADE).
+    rows = "SELECT new.barcode, 0, new.id UNION ALL SELECT new.label, 1, new.id WHERE new.label != ''"
+    execute_script(db, f'''
+        CREATE TRIGGER IF NOT EXISTS units_lookup_ai AFTER INSERT ON units BEGIN
+            INSERT OR IGNORE INTO unit_lookup (key, kind, unit_id) {rows};
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS units_lookup_au AFTER UPDATE OF barcode, label ON units
+        WHEN old.barcode IS NOT new.barcode OR old.label IS NOT new.label BEGIN
+            DELETE FROM unit_lookup WHERE unit_id = old.id;
+            INSERT OR IGNORE INTO unit_lookup (key, kind, unit_id) {rows};
+        END;
+    ''')
+    db.execute('''
+        INSERT OR IGNORE INTO unit_lookup (key, kind, unit_id)
+        SELECT barcode, 0, id FROM units UNION ALL SELECT label, 1, id FROM units WHERE label != ''
+    ''')
+
+
+@migration(13, 'unit archive')
+def create_unit_archive(db):
+    # Closed units moved out of units (src/archive.py): plain columns for analytics and
+    # search results, the rest of the row with its checklist and pins in the blob
+    execute_script(db, '''
+        CREATE TABLE IF NOT EXISTS units_archive (
+            id INTEGER PRIMARY KEY,
+            barcode TEXT UNIQUE NOT NULL,
+            label TEXT,
+            model TEXT,
+            type TEXT,
+            patch_status TEXT,
+            status TEXT,
+            issue TEXT,
+            owner TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            data BLOB NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_units_archive_label ON units_archive(label);
+
+        -- Contentless: the text lives in the blob
+        CREATE VIRTUAL TABLE IF NOT EXISTS units_archive_fts USING fts5(
+            barcode, label, model, issue, notes, owner, condition_notes, content='', tokenize='trigram'
+        );
+    ''')
+
+    # A restored unit is not a new one and an archived one is not deleted: no 'status'
+    # event, and the analytics keep counting the unit wherever it is
+    for name in ('units_events_ai', 'units_stats_ai', 'units_stats_ad'):
+        db.execute(f'DROP TRIGGER IF EXISTS {name}')
+    execute_script(db, '''
+        CREATE TRIGGER units_events_ai AFTER INSERT ON units
+        WHEN NOT EXISTS (SELECT 1 FROM units_archive WHERE id = new.id) BEGIN
+            INSERT INTO unit_events (unit_id, field, old_value, new_value) VALUES (new.id, 'status', NULL, new.status);
+        END;
+    ''')
+    # The other analytics triggers are still there and kept as they are
+    execute_script(db, analytics_triggers(('Done', 'Delivered', 'Cancelled'), archive=True))
+
+
+@migration(14, 'sync tombstones and peers')
+def create_sync_tables(db):
+    # Deleted units leave a tombstone with a change_seq, so deletes travel between databases (src/sync.py)
+    execute_script(db, '''
+        CREATE TABLE IF NOT EXISTS unit_tombstones (
+            barcode TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            change_seq INTEGER NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_unit_tombstones_change_seq ON unit_tombstones(change_seq);
+
+        -- How far this database has pulled from and pushed to each peer (its change_seq on either side)
+        CREATE TABLE IF NOT EXISTS sync_peers (
+            peer TEXT PRIMARY KEY,
+            pulled_seq INTEGER NOT NULL DEFAULT -1,
+            pushed_seq INTEGER NOT NULL DEFAULT -1,
+            synced_at TIMESTAMP
+        );
+
+        -- Moving a unit to the archive is not a delete
+        CREATE TRIGGER IF NOT EXISTS units_tombstones_ad AFTER DELETE ON units
+        WHEN NOT EXISTS (SELECT 1 FROM units_archive WHERE id = old.id) BEGIN
+            UPDATE change_counters SET value = value + 1 WHERE name = 'units';
+            INSERT OR REPLACE INTO unit_tombstones (barcode, version, deleted_at, change_seq)
+            VALUES (old.barcode, old.version, CURRENT_TIMESTAMP, (SELECT value FROM change_counters WHERE name = 'units'));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS units_tombstones_ai AFTER INSERT ON units BEGIN
+            DELETE FROM unit_tombstones WHERE barcode = new.barcode;
+        END;
+    ''')
+
+    # Checklist saves don't touch the unit row, so their version row carries its own change_seq
+    # from the same counter: one cursor covers units, checklists and tombstones
+    if 'change_seq' not in table_columns(db, 'unit_checklist_versions'):
+        db.execute('ALTER TABLE unit_checklist_versions ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0')
+    stamp = '''
+        UPDATE change_counters SET value = value + 1 WHERE name = 'units';
+        UPDATE unit_checklist_versions SET change_seq = (SELECT value FROM change_counters WHERE name = 'units')
+        WHERE unit_id = new.unit_id;
+    '''
+    execute_script(db, f'''
+        CREATE INDEX IF NOT EXISTS idx_unit_checklist_versions_change_seq ON unit_checklist_versions(change_seq);
+
+        CREATE TRIGGER IF NOT EXISTS unit_checklist_versions_changes_ai AFTER INSERT ON unit_checklist_versions BEGIN
+            {stamp}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS unit_checklist_versions_changes_au AFTER UPDATE ON unit_checklist_versions
+        WHEN new.change_seq IS old.change_seq BEGIN
+            {stamp}
+        END;
+    ''')
+
+
+def current_version(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.commit()
+    return db.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations').fetchone()[0]
+
+def migrate(db):
+    """Apply every pending migration in order, returns the list of applied step names."""
+    version = current_version(db)
+    applied = []
+    for step_version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if step_version <= version:
+            continue
+        db.execute('BEGIN')
+        try:
+            fn(db)
+            db.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (step_version, name))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append(f'{step_version:03d} {name}')
+    # Refresh planner statistics for the new indexes. Not on an empty database: stats
+    # recorded for empty tables (the FTS shadow tables especially) make the first bulk
+    # import into it progressively slower.
+    if applied and db.execute('SELECT 1 FROM units LIMIT 1').fetchone():
+        db.execute('ANALYZE')
+        db.commit()
+    return applied
@@ -0,0 +1,47 @@
+import codecs
+import csv
+import json
+
+# Shared CSV / NDJSON readers for the streaming endpoints and CLI commands.
+# Records are yielded one at a time so large uploads never sit in memory.
+
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+
+def detect_format(mimetype, filename=None, default='ndjson'):
+    """Pick 'csv' or 'ndjson' from a content type or file extension."""
+    if mimetype in CSV_MIMETYPES or (filename and filename.lower().endswith('.csv')):
+        return 'csv'
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+def text_lines(stream, encoding='utf-8'):
+    """Decode a binary stream (request body, uploaded file) into text lines.
+
+    Decodes incrementally rather than through io.TextIOWrapper, which needs readable()
+    and friends that a SpooledTemporaryFile upload lacks before Python 3.11.
+    """
+    return codecs.iterdecode(stream, encoding)
+
+def iter_records(lines, fmt):
+    """Yield (line_number, record) pairs from CSV (with a header row) or NDJSON lines.
+
+    A line that can't be decoded yields (line_number, None) instead of aborting the stream.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Header keys are matched case-insensitively
+            yield reader.line_num, {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+        return
+
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield line_number, None
+            continue
+        yield line_number, record if isinstance(record, dict) else None
@@ -1,112 +1,149 @@
-import re
+import argparse
+import csv
+import sys
+from bisect import bisect_right
+from functools import lru_cache
 
-def check_serial(serial):
-    """
-    Analyzes a Nintendo Switch serial number to determine its model and patch status.
-    Returns a dict with 'model', 'patch_status', and 'type'.
-    """
-    serial = serial.upper().strip()
-    
-    # Basic validation
-    if not serial:
-        return {'type': 'Unknown', 'model': 'Unknown', 'patch_status': 'Unknown'}
-
-    # Prefix extraction
-    prefix_3 = serial[:3]
-    try:
-        # Extract the number part from index 3 onwards (usually 11 digits including sub-region)
-        # Chart format: XAW1... -> XAW (prefix) + 1... (number)
-        if len(serial) < 14:
-             return {'type': 'Manual Check Needed', 'model': 'Unknown', 'patch_status': 'Unknown'}
-        
-        number = int(serial[3:]) 
-        
-    except:
-        return {'type': 'Manual Check Needed', 'model': 'Unknown', 'patch_status': 'Unknown'}
-
-    unit_type = "Console"
-    model = "Switch V1 (Erista)"
-    patch_status = "Unknown"
-    
-    # Logic based on community ranges (Image reference)
-    if prefix_3 == 'XAW':
+# Community serial ranges (Image reference).
+# Range tables list (first serial number, patch status) in ascending order: a status
+# applies from its number up to the next entry, the last one has no upper bound.
+# Numbers below the first entry are left 'Unknown'.
+SERIAL_RANGES = {
+    'XAW': [
         # XAW1
-        if 10000000000 <= number < 10074000000:
-            patch_status = "Unpatched"
-        elif 10074000000 <= number < 10120000000:
-            patch_status = "Warning"
-        elif number >= 10120000000 and number < 40000000000:
-            patch_status = "Patched"
+        (10000000000, 'Unpatched'),
+        (10074000000, 'Warning'),
+        (10120000000, 'Patched'),
         # XAW4
-        elif 40000000000 <= number < 40011000000:
-            patch_status = "Unpatched"
-        elif 40011000000 <= number < 40012000000:
-            patch_status = "Warning"
-        elif number >= 40012000000 and number < 70000000000:
-            patch_status = "Patched"
+        (40000000000, 'Unpatched'),
+        (40011000000, 'Warning'),
+        (40012000000, 'Patched'),
         # XAW7
-        elif 70000000000 <= number < 70017800000:
-            patch_status = "Unpatched"
-        elif 70017800000 <= number < 70030000000:
-            patch_status = "Warning"
-        elif number >= 70030000000:
-            patch_status = "Patched"
-
-    elif prefix_3 == 'XAJ':
+        (70000000000, 'Unpatched'),
+        (70017800000, 'Warning'),
+        (70030000000, 'Patched'),
+    ],
+    'XAJ': [
         # XAJ1
-        if 10000000000 <= number < 10020000000:
-            patch_status = "Unpatched"
-        elif 10020000000 <= number < 10030000000:
-            patch_status = "Warning"
-        elif number >= 10030000000 and number < 40000000000:
-            patch_status = "Patched"
+        (10000000000, 'Unpatched'),
+        (10020000000, 'Warning'),
+        (10030000000, 'Patched'),
         # XAJ4
-        elif 40000000000 <= number < 40046000000:
-            patch_status = "Unpatched"
-        elif 40046000000 <= number < 40060000000:
-            patch_status = "Warning"
-        elif number >= 40060000000 and number < 70000000000:
-            patch_status = "Patched"
+        (40000000000, 'Unpatched'),
+        (40046000000, 'Warning'),
+        (40060000000, 'Patched'),
         # XAJ7
-        elif 70000000000 <= number < 70040000000:
-            patch_status = "Unpatched"
-        elif 70040000000 <= number < 70050000000:
-            patch_status = "Warning"
-        elif number >= 70050000000:
-            patch_status = "Patched"
+        (70000000000, 'Unpatched'),
+        (70040000000, 'Warning'),
+        (70050000000, 'Patched'),
+    ],
+}
+
+DEFAULT_MODEL = 'Switch V1 (Erista)'
 
+# Prefixes with a fixed result: (type, model, patch_status).
+# Three-letter prefixes are checked before two-letter ones.
+PREFIX_INFO = {
     # Mariko / Lite / OLED prefixes
-    elif prefix_3 in ['XKW', 'XKJ', 'XJW', 'XWW']:
-        patch_status = "Patched"
-        if prefix_3.startswith('XK') or prefix_3 == 'XWW':
-            model = "Switch V2 (Mariko)"
-        elif prefix_3 == 'XJW':
-            model = "Switch Lite"
-    
-    elif prefix_3 == 'XFL':
-        unit_type = 'Dock'
-        model = "Switch Dock"
-        patch_status = "N/A"
-
-    elif serial.startswith('XT'):
-        patch_status = "Patched"
-        model = "Switch OLED"
-
-    else:
-        # Default fallback
-        patch_status = "Unknown (Check Manually)"
+    'XKW': ('Console', 'Switch V2 (Mariko)', 'Patched'),
+    'XKJ': ('Console', 'Switch V2 (Mariko)', 'Patched'),
+    'XWW': ('Console', 'Switch V2 (Mariko)', 'Patched'),
+    'XJW': ('Console', 'Switch Lite', 'Patched'),
+    'XFL': ('Dock', 'Switch Dock', 'N/A'),
+    'XT': ('Console', 'Switch OLED', 'Patched'),
+}
+
+UNKNOWN = ('Unknown', 'Unknown', 'Unknown')
+MANUAL_CHECK = ('Manual Check Needed', 'Unknown', 'Unknown')
+UNKNOWN_PREFIX = ('Console', DEFAULT_MODEL, 'Unknown (Check Manually)')
+
+def compile_ranges(ranges):
+    """Split a range table into (boundaries, statuses) for bisect, checking it is sorted."""
+    bounds = [start for start, _ in ranges]
+    if bounds != sorted(set(bounds)):
+        raise ValueError('Serial range boundaries must be strictly ascending')
+    return bounds, [status for _, status in ranges]
+
+# Compiled once at import
+RANGE_INDEX = {prefix: compile_ranges(ranges) for prefix, ranges in SERIAL_RANGES.items()}
+
+# Serials are re-checked on every unit save and scan, and intake files repeat them
+SERIAL_CACHE_SIZE = 8192
+
+@lru_cache(maxsize=SERIAL_CACHE_SIZE)
+def classify_serial(serial):
+    """(type, model, patch_status) for a normalized (upper-case, stripped) serial."""
+    # Basic validation
+    if not serial:
+        return UNKNOWN
+
+    # Extract the number part from index 3 onwards (usually 11 digits including sub-region)
+    # Chart format: XAW1... -> XAW (prefix) + 1... (number)
+    if len(serial) < 14:
+        return MANUAL_CHECK
+    try:
+        number = int(serial[3:])
+    except ValueError:
+        return MANUAL_CHECK
+
+    prefix_3 = serial[:3]
+    if prefix_3 in RANGE_INDEX:
+        bounds, statuses = RANGE_INDEX[prefix_3]
+        i = bisect_right(bounds, number) - 1
+        return ('Console', DEFAULT_MODEL, statuses[i] if i >= 0 else 'Unknown')
 
+    info = PREFIX_INFO.get(prefix_3) or PREFIX_INFO.get(serial[:2])
+    if info:
+        return info
+
+    # Default fallback
+    return UNKNOWN_PREFIX
+
+def check_serial(serial):
+    """
+    Analyzes a Nintendo Switch serial number to determine its model and patch status.
+    Returns a dict with 'model', 'patch_status', and 'type'.
+    """
+    unit_type, model, patch_status = classify_serial(serial.upper().strip())
     return {
         'type': unit_type,
         'model': model,
         'patch_status': patch_status
     }
 
+def check_serials(serials):
+    """Classify an iterable of serials, returns a list of check_serial() dicts in the same order."""
+    return [check_serial(serial) for serial in serials]
+
+def read_serials(f):
+    """Serials from an intake file: one per line, or the first column of a CSV."""
+    for row in csv.reader(f):
+        if row and row[0].strip() and not row[0].lstrip().startswith('#'):
+            yield row[0].strip()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Classify Nintendo Switch serials (model and patch status).')
+    parser.add_argument('files', nargs='*', help="Intake files (one serial per line or CSV, '-' for stdin)")
+    args = parser.parse_args(argv)
+
+    if not args.files:
+        # Test cases from image
+        print(f"XAW100740...: {check_serial('XAW10074000000')['patch_status']}") # Possibly
+        print(f"XAJ400460...: {check_serial('XAJ40046000000')['patch_status']}") # Possibly
+        print(f"XAJ400643...: {check_serial('XAJ40064380854')['patch_status']}") # Patched
+        print(f"XKW100000...: {check_serial('XKW10000000000')['patch_status']}") # Patched
+        print(f"XJW100000...: {check_serial('XJW10000000000')['patch_status']}") # Patched
+        print(f"XFL103552...: {check_serial('XFL10355204732')}") # Dock
+        return
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['serial', 'type', 'model', 'patch_status'])
+    for path in args.files:
+        f = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        with f:
+            for serial in read_serials(f):
+                info = check_serial(serial)
+                writer.writerow([serial, info['type'], info['model'], info['patch_status']])
+
 if __name__ == '__main__':
-    # Test cases from image
-    print(f"XAW100740...: {check_serial('XAW10074000000')['patch_status']}") # Possibly
-    print(f"XAJ400460...: {check_serial('XAJ40046000000')['patch_status']}") # Possibly
-    print(f"XAJ400643...: {check_serial('XAJ40064380854')['patch_status']}") # Patched
-    print(f"XKW100000...: {check_serial('XKW10000000000')['patch_status']}") # Patched
-    print(f"XJW100000...: {check_serial('XJW10000000000')['patch_status']}") # Patched
-    print(f"XFL103552...: {check_serial('XFL10355204732')}") # Dock
+    main()
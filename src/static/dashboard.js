@@ -1,71 +1,20 @@
 document.addEventListener('DOMContentLoaded', () => {
-    // Parse Pin JSON for dashboard
-    document.querySelectorAll('.pin-summary').forEach(el => {
-        try {
-            const data = JSON.parse(el.dataset.json);
-            const isDock = el.dataset.type === 'Dock';
-
-            const olPins = [];
-            let totalOLCount = 0; // Track all OL pins including expected ones
-
-            // Expected OL pins (Normal)
-            let expectedOL = [];
-            if (isDock) {
-                // Dock: Data/CC lines are normally OL.
-                // Expected OL: 2,3,5,6,7,8,10,11,14,15,17,18,19,20,22,23
-                // (Basically everything except GND and VBUS)
-                // VBUS: 4, 9, 16, 21. GND: 1, 12, 13, 24.
-                expectedOL = ['2', '3', '5', '6', '7', '8', '10', '11', '14', '15', '17', '18', '19', '20', '22', '23'];
-            } else {
-                // Console: 2, 3, 10, 11, 14, 15, 22, 23
-                expectedOL = ['2', '3', '10', '11', '14', '15', '22', '23'];
-            }
-
-            for (const [pin, val] of Object.entries(data)) {
-                if (val.toUpperCase() === 'OL') {
-                    totalOLCount++;
-                    if (!expectedOL.includes(pin)) {
-                        olPins.push(pin);
-                    }
+    // Search Filter (server-side, the table only holds the current page)
+    // No submit button, so Enter has to be wired up for each text field
+    const filterForm = document.getElementById('filterForm');
+    if (filterForm) {
+        filterForm.querySelectorAll('input[type="text"]').forEach(input => {
+            input.addEventListener('keydown', function (e) {
+                if (e.key === 'Enter') {
+                    e.preventDefault();
+                    filterForm.submit();
                 }
-            }
-
-            // Check for Ripped Off Port (Most/All pins OL)
-            // If > 20 OLs, likely ripped off or major disconnect
-            // For Dock, if even VBUS is OL, that's bad.
-            // If olPins has entries, it means VBUS or GND is OL (critical)
-
-            if (totalOLCount >= 23) { // 23 or 24 pins OL
-                el.innerHTML = `<strong style="color:var(--accent-red);">RIPPED OFF</strong> <span style="color:var(--text-muted);">(${totalOLCount} OL)</span>`;
-            } else if (olPins.length > 0) {
-                el.innerHTML = `<span style="color:var(--accent-red); font-weight:bold;">OL: ${olPins.join(',')}</span>`;
-            } else if (Object.keys(data).length > 0) {
-                el.innerHTML = `<span style="color:var(--accent-green); font-weight:bold;">PINS OK</span>`;
-            } else {
-                // Empty JSON
-                el.innerHTML = `<span style="color:var(--text-muted);">CHECKED</span>`;
-            }
-        } catch (e) { console.error(e); }
-    });
-
-    // Search Filter
-    const searchInput = document.getElementById('searchInput');
-    if (searchInput) {
-        searchInput.addEventListener('keyup', function () {
-            let filter = this.value.toUpperCase();
-            let rows = document.querySelector("#unitsTable tbody").rows;
-
-            for (let i = 0; i < rows.length; i++) {
-                let text = rows[i].textContent || rows[i].innerText;
-                if (text.toUpperCase().indexOf(filter) > -1) {
-                    rows[i].style.display = "";
-                } else {
-                    rows[i].style.display = "none";
-                }
-            }
+            });
         });
     }
 
+    connectLiveUpdates();
+
     // Load QWERTY fix setting from localStorage
     const toggleBtn = document.getElementById('qwerty-toggle');
     if (toggleBtn) {
@@ -85,6 +34,67 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
+// Live updates: the server pushes changed units (rendered rows) over SSE,
+// rows are patched in place instead of reloading the whole dashboard
+function connectLiveUpdates() {
+    const table = document.getElementById('unitsTable');
+    if (!table || !window.EventSource) return;
+
+    const params = new URLSearchParams(window.location.search);
+    // Only the first page shows the newest units, older pages just update rows they hold
+    const firstPage = !params.has('after') && !params.has('before');
+    params.delete('after');
+    params.delete('before');
+    params.set('since', table.dataset.feedSeq);
+
+    // EventSource reconnects on its own and resumes from the last event it got
+    const source = new EventSource('/api/events?' + params.toString());
+    source.addEventListener('units', (e) => applyUnitChanges(table, JSON.parse(e.data), firstPage));
+    source.addEventListener('resync', () => {
+        source.close();
+        window.location.reload();
+    });
+}
+
+function applyUnitChanges(table, data, firstPage) {
+    const tbody = table.tBodies[0];
+    const pageSize = parseInt(table.dataset.pageSize, 10) || 50;
+
+    data.units.forEach(unit => {
+        const existing = tbody.querySelector('tr[data-barcode="' + CSS.escape(unit.barcode) + '"]');
+        if (!unit.matches) {
+            // No longer fits this screen's filters (e.g. closed on an "Active Only" view)
+            if (existing) existing.remove();
+            return;
+        }
+
+        const template = document.createElement('template');
+        template.innerHTML = unit.html.trim();
+        const row = template.content.firstElementChild;
+        row.classList.add('row-updated');
+
+        if (firstPage) {
+            // Just updated, so it is the newest: move it to the top
+            if (existing) existing.remove();
+            tbody.querySelectorAll('tr:not([data-barcode])').forEach(placeholder => placeholder.remove());
+            tbody.insertBefore(row, tbody.firstElementChild);
+        } else if (existing) {
+            existing.replaceWith(row);
+        }
+    });
+
+    if (firstPage) {
+        while (tbody.rows.length > pageSize) {
+            tbody.lastElementChild.remove();
+        }
+    }
+
+    const inProgress = document.getElementById('stat-in-progress');
+    const total = document.getElementById('stat-total');
+    if (inProgress) inProgress.textContent = data.totals.in_progress;
+    if (total) total.textContent = data.totals.units;
+}
+
 // Global functions for inline handlers
 
 window.toggleQwertyFix = function () {
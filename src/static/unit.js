@@ -577,14 +577,17 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!barcode || barcode === 'unit') return;
 
         const serial = barcode;
+        checklistSync.onServerState = renderChecklist;
 
         try {
             const response = await fetch(`/api/unit/${serial}/checklist`);
             const data = await response.json();
-            renderChecklist(data.checklist || {});
+            // Changes queued while offline (or before a reload) win over the server copy
+            const state = checklistSync.init(serial, data.version);
+            renderChecklist(Object.assign(data.checklist || {}, state));
         } catch (error) {
             console.error('Failed to load checklist:', error);
-            renderChecklist({});
+            renderChecklist(checklistSync.init(serial, null));
         }
     }
 
@@ -723,100 +726,153 @@ function updateChecklistButton() {
     }
 }
 
-// Global function for toggling checklist items (must be outside DOMContentLoaded for onclick)
-async function toggleChecklistItem(itemKey) {
-    const item = document.querySelector(`.checklist-item[data-key="${itemKey}"]`);
-    if (!item) return;
+// Checklist write coalescer: clicks are merged into one pending batch, sent after
+// a short debounce with the version it was based on, one request at a time.
+// Pending changes are kept in localStorage and retried with backoff when the
+// server can't be reached, and re-sent on top of the newer state after a 409.
+const checklistSync = {
+    DEBOUNCE_MS: 400,
+    MIN_RETRY_MS: 1000,
+    MAX_RETRY_MS: 30000,
+    barcode: null,
+    version: null,
+    pending: {},
+    inFlight: null,
+    timer: null,
+    retryDelay: 1000,
+    // Set by the page: renders a full {item: checked} state
+    onServerState: null,
+
+    storageKey() {
+        return `checklist-pending:${this.barcode}`;
+    },
+
+    // Returns the changes still queued from a previous visit
+    init(barcode, version) {
+        this.barcode = barcode;
+        this.version = version;
+        try {
+            this.pending = JSON.parse(localStorage.getItem(this.storageKey())) || {};
+        } catch (e) {
+            this.pending = {};
+        }
+        if (Object.keys(this.pending).length > 0) {
+            this.schedule(0);
+        }
+        return Object.assign({}, this.pending);
+    },
 
-    item.classList.toggle('completed');
+    persist() {
+        const queued = Object.assign({}, this.inFlight, this.pending);
+        if (Object.keys(queued).length > 0) {
+            localStorage.setItem(this.storageKey(), JSON.stringify(queued));
+        } else {
+            localStorage.removeItem(this.storageKey());
+        }
+    },
 
-    // Save checklist state
-    const pathParts = window.location.pathname.split('/');
-    const barcode = pathParts[pathParts.length - 1];
+    queue(changes) {
+        if (!this.barcode) return;
+        Object.assign(this.pending, changes);
+        this.persist();
+        this.schedule(this.DEBOUNCE_MS);
+    },
 
-    if (!barcode || barcode === 'unit') return;
+    schedule(delay) {
+        clearTimeout(this.timer);
+        this.timer = setTimeout(() => this.flush(), delay);
+    },
 
-    const items = document.querySelectorAll('.checklist-item');
-    const state = {};
+    async flush() {
+        if (this.inFlight || Object.keys(this.pending).length === 0) return;
 
-    items.forEach(item => {
-        const key = item.getAttribute('data-key');
-        state[key] = item.classList.contains('completed');
-    });
+        this.inFlight = this.pending;
+        this.pending = {};
+        let retry = false;
 
-    try {
-        await fetch(`/api/unit/${barcode}/checklist`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ checklist: state })
-        });
-    } catch (error) {
-        console.error('Failed to save checklist:', error);
+        try {
+            const res = await fetch(`/api/unit/${this.barcode}/checklist`, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ changes: this.inFlight, version: this.version })
+            });
+            const data = await res.json();
+
+            if (res.status === 409) {
+                // Someone else saved first: show their state, then resend on their version
+                // only what we still change on top of it
+                this.version = data.version;
+                const server = data.checklist || {};
+                const queued = Object.assign({}, this.inFlight, this.pending);
+                this.pending = {};
+                for (const [key, checked] of Object.entries(queued)) {
+                    if (Boolean(server[key]) !== checked) this.pending[key] = checked;
+                }
+                if (this.onServerState) this.onServerState(Object.assign({}, server, this.pending));
+            } else if (res.ok) {
+                this.version = data.version;
+                this.retryDelay = this.MIN_RETRY_MS;
+            } else if (res.status >= 500) {
+                retry = true;
+            } else {
+                // 4xx: the request itself is wrong, retrying won't help
+                console.error('Checklist save rejected:', data.error);
+            }
+        } catch (error) {
+            // Network down / server restarting
+            retry = true;
+        }
+
+        if (retry) {
+            this.pending = Object.assign({}, this.inFlight, this.pending);
+        }
+        this.inFlight = null;
+        this.persist();
+
+        if (retry) {
+            this.schedule(this.retryDelay);
+            this.retryDelay = Math.min(this.retryDelay * 2, this.MAX_RETRY_MS);
+        } else if (Object.keys(this.pending).length > 0) {
+            this.schedule(this.DEBOUNCE_MS);
+        }
     }
+};
+
+window.addEventListener('online', () => checklistSync.schedule(0));
+
+// Global function for toggling checklist items (must be outside DOMContentLoaded for onclick)
+function toggleChecklistItem(itemKey) {
+    const item = document.querySelector(`.checklist-item[data-key="${itemKey}"]`);
+    if (!item) return;
+
+    item.classList.toggle('completed');
+    checklistSync.queue({ [itemKey]: item.classList.contains('completed') });
 
     // Update button state after toggle
     updateChecklistButton();
 }
 
-// Global function for "Mark All Complete" button
-function markAllTestsComplete() {
+// Set every item to the same value in one batch
+function setAllChecklistItems(checked) {
+    const changes = {};
     document.querySelectorAll('.checklist-item').forEach(item => {
-        item.classList.add('completed');
+        item.classList.toggle('completed', checked);
+        changes[item.getAttribute('data-key')] = checked;
     });
-
-    // Manual save call
-    const pathParts = window.location.pathname.split('/');
-    const barcode = pathParts[pathParts.length - 1];
-
-    if (barcode && barcode !== 'unit') {
-        const serial = barcode;
-        const items = document.querySelectorAll('.checklist-item');
-        const state = {};
-
-        items.forEach(item => {
-            const key = item.getAttribute('data-key');
-            state[key] = true; // All completed
-        });
-
-        fetch(`/api/unit/${serial}/checklist`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ checklist: state })
-        }).catch(error => console.error('Failed to save checklist:', error));
-    }
+    checklistSync.queue(changes);
 
     // Update button state
     updateChecklistButton();
 }
 
+// Global function for "Mark All Complete" button
+function markAllTestsComplete() {
+    setAllChecklistItems(true);
+}
+
 // Global function for "Reset" button
 function resetChecklist() {
-    document.querySelectorAll('.checklist-item').forEach(item => {
-        item.classList.remove('completed');
-    });
-
-    // Manual save call
-    const pathParts = window.location.pathname.split('/');
-    const barcode = pathParts[pathParts.length - 1];
-
-    if (barcode && barcode !== 'unit') {
-        const items = document.querySelectorAll('.checklist-item');
-        const state = {};
-
-        items.forEach(item => {
-            const key = item.getAttribute('data-key');
-            state[key] = false; // All unchecked
-        });
-
-        fetch(`/api/unit/${barcode}/checklist`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ checklist: state })
-        }).catch(error => console.error('Failed to save checklist:', error));
-    }
-
-    // Update button state
-    updateChecklistButton();
+    setAllChecklistItems(false);
 }
 
 // Global function to toggle checklist section collapse/expand
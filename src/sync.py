@@ -0,0 +1,264 @@
+import json
+import urllib.request
+from src.archive import restore_unit
+from src.checks import checklist_version, set_checklist_version
+from src.labels import observe_label
+
+# Incremental sync between two tracker databases (two benches or shops).
+# Every unit write stamps the row with the next change_seq (migration 11), checklist saves
+# stamp the unit's checklist version row and deleted units leave a tombstone with one
+# (migration 14), so "what changed since seq N" is an index range scan on each table and a
+# sync costs O(changes), not O(database).
+#
+# Units are matched by barcode (ids differ between databases). A change carries the whole
+# row with its checklist and pin readings; the side with the greater sync_key() wins, so both
+# databases settle on the same row whichever order they sync in. Archived units stay local:
+# each side archives by the same rule (updated_at travels with the row).
+#
+# version and checklist_version are what ETags and the unit form's and checklist's stale
+# write checks compare, so an applied row bumps them locally like any other write. They can
+# differ between the two sides afterwards; rows equal apart from them are the same row.
+# checklist_version lives in unit_checklist_versions but travels in the unit record.
+
+SYNC_BATCH = 200
+
+# Local bookkeeping, never sent
+LOCAL_COLUMNS = ('id', 'change_seq')
+
+# Sent, but bumped by every write on either side
+COUNTER_COLUMNS = ('version', 'checklist_version')
+
+def unit_columns(db):
+    return [row[1] for row in db.execute('PRAGMA table_info(units)') if row[1] not in LOCAL_COLUMNS]
+
+def unit_changes(db, rows):
+    """Change records ({barcode, unit, checklist, pins}) for unit rows."""
+    if not rows:
+        return []
+    ids = [row['id'] for row in rows]
+    placeholders = ', '.join('?' * len(ids))
+    versions = dict(db.execute(
+        f'SELECT unit_id, version FROM unit_checklist_versions WHERE unit_id IN ({placeholders})', ids).fetchall())
+    checklists = {}
+    for unit_id, item, checked, updated_at in db.execute(f'''
+            SELECT unit_id, item, checked, updated_at FROM unit_checklist WHERE unit_id IN ({placeholders})
+            ORDER BY unit_id, item''', ids):
+        checklists.setdefault(unit_id, []).append([item, checked, updated_at])
+    pins = {}
+    for unit_id, pin, value in db.execute(f'''
+            SELECT unit_id, pin, value FROM unit_pin_readings WHERE unit_id IN ({placeholders})
+            ORDER BY unit_id, pin''', ids):
+        pins.setdefault(unit_id, []).append([pin, value])
+    columns = unit_columns(db)
+    return [{'barcode': row['barcode'],
+             'unit': {**{c: row[c] for c in columns}, 'checklist_version': versions.get(row['id'], 0)},
+             'checklist': checklists.get(row['id'], []), 'pins': pins.get(row['id'], [])} for row in rows]
+
+def collect_changes(db, since, limit=SYNC_BATCH):
+    """Units and tombstones changed after `since`, at most `limit` units per call.
+
+    `next` is the seq to ask from next time and `more` says whether to ask right away.
+    Use since=-1 for a first sync: rows written before migration 11 have change_seq 0.
+    """
+    # Read first: anything committed after this gets a higher seq and goes in the next batch
+    current = db.execute("SELECT value FROM change_counters WHERE name = 'units'").fetchone()[0]
+    # Units whose row or checklist changed, by the seq of that change
+    rows = db.execute('''
+        SELECT * FROM (
+            SELECT change_seq AS seq, units.* FROM units WHERE change_seq > :since AND change_seq <= :current
+            UNION ALL
+            SELECT v.change_seq, units.* FROM unit_checklist_versions v JOIN units ON units.id = v.unit_id
+            WHERE v.change_seq > :since AND v.change_seq <= :current
+        ) ORDER BY seq LIMIT :limit
+    ''', {'since': since, 'current': current, 'limit': limit}).fetchall()
+    more = len(rows) == limit
+    # Tombstones in the same seq range, so nothing between two batches is skipped
+    upto = rows[-1]['seq'] if more else current
+    # Row and checklist both changed: sent once
+    rows = list({row['id']: row for row in rows}.values())
+    tombstones = db.execute('''
+        SELECT barcode, version, deleted_at FROM unit_tombstones WHERE change_seq > ? AND change_seq <= ?
+        ORDER BY change_seq
+    ''', (since, upto)).fetchall()
+    return {'changes': unit_changes(db, rows), 'tombstones': [dict(t) for t in tombstones],
+            'next': max(upto, since), 'more': more}
+
+def sync_key(change):
+    """Total order on versions of a unit: last save, then edit count, then checklist edits,
+    then the content itself so that two different rows never tie."""
+    unit = change['unit']
+    return (unit.get('updated_at') or '', unit.get('version') or 0, unit.get('checklist_version') or 0,
+            json.dumps(change, sort_keys=True))
+
+def same_row(change, other):
+    """Whether two change records hold the same row, whatever their counters say."""
+    def content(c):
+        return json.dumps({**c, 'unit': {k: v for k, v in c['unit'].items() if k not in COUNTER_COLUMNS}},
+                          sort_keys=True)
+    return content(change) == content(other)
+
+def write_unit(db, local, change, columns):
+    """Insert or overwrite a unit with a change record's row, checklist and pins, returns its id."""
+    unit = {c: change['unit'].get(c) for c in columns}
+    counters = {c: change['unit'].get(c) or 0 for c in COUNTER_COLUMNS}
+    if local is None:
+        unit_id = db.execute(f'INSERT INTO units ({", ".join(unit)}) VALUES ({", ".join("?" * len(unit))}) RETURNING id',
+                             list(unit.values())).fetchone()[0]
+    else:
+        unit_id = local['id']
+        # Past both sides' counters: pages and forms rendered from the old row are stale now
+        local_counters = {'version': local['version'], 'checklist_version': checklist_version(db, unit_id)}
+        counters = {c: max(local_counters[c] or 0, counters[c]) + 1 for c in COUNTER_COLUMNS}
+        unit['version'] = counters['version']
+        db.execute(f'UPDATE units SET {", ".join(f"{c} = ?" for c in unit)} WHERE id = ?', [*unit.values(), unit_id])
+    if counters['checklist_version']:
+        set_checklist_version(db, unit_id, counters['checklist_version'])
+    db.execute('DELETE FROM unit_checklist WHERE unit_id = ?', (unit_id,))
+    db.executemany('INSERT INTO unit_checklist (unit_id, item, checked, updated_at) VALUES (?, ?, ?, ?)',
+                   [(unit_id, *item) for item in change['checklist']])
+    db.execute('DELETE FROM unit_pin_readings WHERE unit_id = ?', (unit_id,))
+    db.executemany('INSERT INTO unit_pin_readings (unit_id, pin, value) VALUES (?, ?, ?)',
+                   [(unit_id, *pin) for pin in change['pins']])
+    # Labels handed out at the other bench move this bench's counter past them
+    observe_label(db, unit.get('label'))
+    return unit_id
+
+def empty_stats():
+    return {'applied': 0, 'skipped': 0, 'deleted': 0, 'label_conflicts': []}
+
+def label_conflict(db, barcode, label):
+    """Another unit here with `label`, as {label, barcode, local_barcode}, or None."""
+    if not label:
+        return None
+    other = db.execute('''
+        SELECT barcode FROM units WHERE label = :label AND barcode != :barcode
+        UNION ALL SELECT barcode FROM units_archive WHERE label = :label AND barcode != :barcode
+        LIMIT 1
+    ''', {'label': label, 'barcode': barcode}).fetchone()
+    return {'label': label, 'barcode': barcode, 'local_barcode': other[0]} if other else None
+
+def apply_changes(db, payload):
+    """Merge a collect_changes() payload from another database. The caller commits.
+
+    Rows written here get a new local change_seq, so they are sent back on the next
+    push; the other side finds the same row and skips it, which ends the echo.
+    Labels both sides handed out to different units between syncs are written
+    as they are and listed in `label_conflicts`, to be relabelled by hand.
+    """
+    stats = empty_stats()
+    columns = unit_columns(db)
+    for change in payload.get('changes', []):
+        barcode = change['barcode']
+        incoming = sync_key(change)
+        local = db.execute('SELECT * FROM units WHERE barcode = ?', (barcode,)).fetchone()
+        if local is None:
+            archived = db.execute('SELECT updated_at, version FROM units_archive WHERE barcode = ?',
+                                  (barcode,)).fetchone()
+            tombstone = db.execute('SELECT deleted_at FROM unit_tombstones WHERE barcode = ?', (barcode,)).fetchone()
+            if archived and incoming[:2] <= (archived['updated_at'] or '', archived['version']):
+                stats['skipped'] += 1
+                continue
+            if tombstone and incoming[0] <= (tombstone['deleted_at'] or ''):
+                # Deleted here after the other side's last edit
+                stats['skipped'] += 1
+                continue
+            if archived:
+                restore_unit(db, barcode)
+                local = db.execute('SELECT * FROM units WHERE barcode = ?', (barcode,)).fetchone()
+        if local is not None:
+            current = unit_changes(db, [local])[0]
+            if same_row(change, current) or incoming <= sync_key(current):
+                stats['skipped'] += 1
+                continue
+        write_unit(db, local, change, columns)
+        stats['applied'] += 1
+        conflict = label_conflict(db, barcode, change['unit'].get('label'))
+        if conflict:
+            stats['label_conflicts'].append(conflict)
+
+    for tombstone in payload.get('tombstones', []):
+        local = db.execute('SELECT id, updated_at FROM units WHERE barcode = ?', (tombstone['barcode'],)).fetchone()
+        if local is None or (local['updated_at'] or '') > (tombstone['deleted_at'] or ''):
+            # Already gone, or edited here after the delete: the edit wins and travels back
+            stats['skipped'] += 1
+            continue
+        db.execute('DELETE FROM units WHERE id = ?', (local['id'],))
+        # Keep the original deletion time so both sides compare the same values
+        db.execute('UPDATE unit_tombstones SET version = ?, deleted_at = ? WHERE barcode = ?',
+                   (tombstone['version'], tombstone['deleted_at'], tombstone['barcode']))
+        stats['deleted'] += 1
+    return stats
+
+class DatabasePeer:
+    """Another tracker database on this machine (e.g. a second bench's mounted data directory)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def fetch(self, since, limit):
+        return collect_changes(self.db, since, limit)
+
+    def apply(self, payload):
+        stats = apply_changes(self.db, payload)
+        self.db.commit()
+        return stats
+
+class HttpPeer:
+    """A running tracker, through /api/sync/changes and /api/sync/apply."""
+
+    def __init__(self, url, token=None, timeout=60):
+        self.url = url.rstrip('/')
+        self.headers = {'Content-Type': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f'Bearer {token}'
+        self.timeout = timeout
+
+    def _request(self, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, headers=self.headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def fetch(self, since, limit):
+        return self._request(f'/api/sync/changes?since={since}&limit={limit}')
+
+    def apply(self, payload):
+        return self._request('/api/sync/apply', {'changes': payload['changes'], 'tombstones': payload['tombstones']})
+
+def sync(db, peer, name, batch=SYNC_BATCH):
+    """Pull the peer's changes into `db`, then push `db`'s changes to the peer.
+
+    Progress is saved per batch in sync_peers under `name`, so an interrupted
+    sync resumes where it stopped. Returns pull and push stats.
+    """
+    db.execute('INSERT OR IGNORE INTO sync_peers (peer) VALUES (?)', (name,))
+    db.commit()
+    state = db.execute('SELECT pulled_seq, pushed_seq FROM sync_peers WHERE peer = ?', (name,)).fetchone()
+    totals = {'pulled': empty_stats(), 'pushed': empty_stats()}
+
+    since = state['pulled_seq']
+    while True:
+        payload = peer.fetch(since, batch)
+        for key, value in apply_changes(db, payload).items():
+            totals['pulled'][key] += value
+        since = payload['next']
+        # Saved with the rows it covers
+        db.execute('UPDATE sync_peers SET pulled_seq = ? WHERE peer = ?', (since, name))
+        db.commit()
+        if not payload['more']:
+            break
+
+    since = state['pushed_seq']
+    while True:
+        payload = collect_changes(db, since, batch)
+        for key, value in peer.apply(payload).items():
+            totals['pushed'][key] += value
+        since = payload['next']
+        db.execute('UPDATE sync_peers SET pushed_seq = ? WHERE peer = ?', (since, name))
+        db.commit()
+        if not payload['more']:
+            break
+
+    db.execute('UPDATE sync_peers SET synced_at = CURRENT_TIMESTAMP WHERE peer = ?', (name,))
+    db.commit()
+    return totals
@@ -0,0 +1,22 @@
+import os
+import sys
+from src.app import app, init_db, STREAM_THREADS
+from src.db import close_connections
+
+# Production entry point.
+#   Linux / Docker:  gunicorn -c python:src.gunicorn_conf src.wsgi:app
+#   Windows:         python -m src.wsgi (waitress, gunicorn doesn't run there)
+
+def main():
+    """Serve the app with the production server for this platform."""
+    if os.name != 'nt':
+        os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'python:src.gunicorn_conf', 'src.wsgi:app'])
+
+    from waitress import serve
+    init_db()
+    close_connections()
+    serve(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5000)),
+          threads=int(os.environ.get('THREADS', 8)) + STREAM_THREADS)
+
+if __name__ == '__main__':
+    main()